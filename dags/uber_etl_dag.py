@@ -1,10 +1,23 @@
 import os
 from datetime import datetime, timedelta
+from pathlib import Path
 
 from airflow import DAG
 from airflow.providers.standard.operators.bash import BashOperator
+from airflow.providers.standard.operators.python import PythonOperator
+
+from include.dbt_invoke import run_dbt_build
+from include.dbt_task_groups import build_dbt_task_groups, dbt_bash_command, load_manifest
+from include.snowflake_copy import SnowflakeParallelCopyOperator
+from include.tlc_availability import TLCPublicationSensor
 
 DATA_YEAR_RANGE = os.getenv("DATA_YEAR_RANGE", "2025-2026")
+# 'warehouse' loads raw files and transforms them with dbt; 'local' transforms them on the worker
+# and loads fact-ready files straight into the fact table.
+ETL_MODE = os.getenv("ETL_MODE", "warehouse")
+# 'build' runs one in-process `dbt build`; 'per_model' renders one task group per model from the manifest.
+DBT_EXECUTION_MODE = os.getenv("DBT_EXECUTION_MODE", "build")
+DBT_MANIFEST_PATH = os.getenv("DBT_MANIFEST_PATH", "/usr/local/airflow/dbt/target/manifest.json")
 
 with DAG(
     dag_id="uber_etl",
@@ -19,10 +32,11 @@ with DAG(
 
     This DAG automates the full monthly refresh:
     - Checks for new HVFHV Parquet files
+    - Waits until TLC has published them
     - Downloads them
-    - Uploads to Snowflake stage
-    - Loads into raw table
-    - Runs dbt models and tests
+    - Uploads to Snowflake stage and loads into raw table
+      (or, in local ETL mode, transforms them on the worker and loads the fact table)
+    - Builds dbt models and runs their tests, stopping downstream models when an upstream test fails
     """,
 ) as dag:
 
@@ -36,85 +50,165 @@ with DAG(
     check_for_new_data = BashOperator(
         task_id="check_for_new_data",
         cwd=CWD,
-        bash_command=f"python include/check_for_new_data.py --years={years}",
+        bash_command=f"python include/check_for_new_data.py --years={years} --etl-mode={ETL_MODE}",
         doc_md="""
         ### Check for New Data Availability
 
-        Checks which monthly HVFHV Parquet files are missing from the Snowflake stage
-        and outputs the list of missing dates (e.g., '2024-01,2024-02') to XComs.
+        Checks which months are not loaded in Snowflake yet and outputs the list of missing
+        dates (e.g., '2024-01,2024-02') to XComs. A month is present once its trips are in the
+        raw table, or in local ETL mode in either the raw table or the fact table; a month that
+        was staged but failed to load is still missing and is retried.
         """,
         do_xcom_push=True,
     )
 
+    wait_for_tlc_publication = TLCPublicationSensor(
+        task_id="wait_for_tlc_publication",
+        missing_dates="{{ task_instance.xcom_pull(task_ids='check_for_new_data', key='return_value') }}",
+        poll_interval=timedelta(hours=6),
+        timeout=timedelta(days=14).total_seconds(),
+        soft_fail=True,
+        doc_md="""
+        ### Wait for TLC Publication
+
+        Deferrable sensor that HEAD-probes the TLC CDN for the missing months concurrently
+        from the triggerer, without holding a worker slot. Completes once at least one month
+        is published and outputs only the published dates (e.g., '2024-01,2024-02') to XComs.
+        """,
+    )
+
     download_data = BashOperator(
         task_id="download_data",
         cwd=CWD,
         bash_command="""
-        missing_dates_output="{{ task_instance.xcom_pull(task_ids='check_for_new_data', key='return_value') }}"
-        if [[ "$missing_dates_output" == "missing_dates="* ]]; then
-            missing_dates=$(echo "$missing_dates_output" | cut -d'=' -f2)
-            if [[ -n "$missing_dates" ]]; then
-                python include/download_data.py --dates "$missing_dates"
-            else
-                echo "No new dates to download."
-            fi
+        available_dates="{{ task_instance.xcom_pull(task_ids='wait_for_tlc_publication', key='return_value') }}"
+        if [[ -n "$available_dates" && "$available_dates" != "None" ]]; then
+            python include/download_data.py --dates "$available_dates" && python include/parquet_index.py build
         else
-            echo "No missing dates output from previous task."
+            echo "No new dates to download."
         fi
         """,
         doc_md="""
         ### Download HVFHV Parquet Files
 
-        Downloads missing High-Volume FHV trip data based on the dates
-        provided by the `check_for_new_data` task.
-        """,
-    )
-
-    upload_data_to_stage = BashOperator(
-        task_id="upload_data_to_stage",
-        cwd=CWD,
-        bash_command=f"python include/upload_data.py",
-        doc_md="""
-        ### Upload Files to Snowflake Internal Stage
-
-        Uses SnowSQL to PUT local Parquet files into the Snowflake internal stage.
-        """,
-    )
-
-    load_raw_table = BashOperator(
-        task_id="load_raw_table",
-        cwd=CWD,
-        bash_command=f"python include/get_data_into_raw_table.py",
-        doc_md="""
-        ### Copy Data from Stage into Raw Table
-
-        Executes COPY INTO to load new Parquet files into the raw HVFHV_TRIPS table.
-        Uses MATCH_BY_COLUMN_NAME and logical type support for correct timestamps.
+        Downloads High-Volume FHV trip data for the published dates
+        provided by the `wait_for_tlc_publication` sensor, then builds the
+        zone-map index sidecars of the new files.
         """,
     )
 
-    dbt_run = BashOperator(
-        task_id="dbt_run",
-        cwd=CWD,
-        bash_command=f"cd dbt && dbt run",
-        doc_md="""
-        ### Transform Data with dbt
-
-        Runs all dbt models: staging → marts (fact/dim tables).
-        Builds clustered, optimized tables in the MART schema.
-        """,
-    )
-
-    dbt_test = BashOperator(
-        task_id="dbt_test",
-        cwd=CWD,
-        bash_command=f"cd dbt && dbt test",
-        doc_md="""
-        ### Validate Data Quality
-
-        Runs all dbt tests (not_null, unique, relationships, freshness, etc.).
-        """,
-    )
-
-
-    check_for_new_data >> download_data >> upload_data_to_stage >> load_raw_table >> dbt_run >> dbt_test
+    if ETL_MODE == "local":
+        local_transform = BashOperator(
+            task_id="local_transform",
+            cwd=CWD,
+            bash_command="""
+            available_dates="{{ task_instance.xcom_pull(task_ids='wait_for_tlc_publication', key='return_value') }}"
+            if [[ -n "$available_dates" && "$available_dates" != "None" ]]; then
+                python include/local_transform.py transform --dates "$available_dates"
+            else
+                echo "No new dates to transform."
+            fi
+            """,
+            doc_md="""
+            ### Transform Locally
+
+            Streams each month's Parquet file one row group at a time across all CPU cores and
+            writes fact-ready Parquet (stg_uber_trips filters, trip_id and trip_flags_id keys).
+            """,
+        )
+
+        load_fact_table = BashOperator(
+            task_id="load_fact_table",
+            cwd=CWD,
+            bash_command="""
+            available_dates="{{ task_instance.xcom_pull(task_ids='wait_for_tlc_publication', key='return_value') }}"
+            if [[ -n "$available_dates" && "$available_dates" != "None" ]]; then
+                python include/local_transform.py load --dates "$available_dates"
+            else
+                echo "No new dates to load."
+            fi
+            """,
+            doc_md="""
+            ### Load Fact Table
+
+            PUTs the transformed files under transformed/year=YYYY/month=MM/ in the stage,
+            copies them into a temporary table and inserts the trips not yet in FACT_TRIPS,
+            skipping the raw table. Creates FACT_TRIPS, and an empty raw FHV_TRIPS
+            for the dbt staging model and source tests, if they do not exist yet.
+            """,
+        )
+
+        check_for_new_data >> wait_for_tlc_publication >> download_data >> local_transform >> load_fact_table
+        data_loaded = load_fact_table
+    else:
+        upload_data_to_stage = BashOperator(
+            task_id="upload_data_to_stage",
+            cwd=CWD,
+            bash_command="""
+            available_dates="{{ task_instance.xcom_pull(task_ids='wait_for_tlc_publication', key='return_value') }}"
+            if [[ -n "$available_dates" && "$available_dates" != "None" ]]; then
+                python include/upload_data.py --dates "$available_dates"
+            else
+                echo "No new dates to upload."
+            fi
+            """,
+            doc_md="""
+            ### Upload Files to Snowflake Internal Stage
+
+            Uses SnowSQL to PUT the local Parquet files of the published dates into the
+            Snowflake internal stage under year=YYYY/month=MM/ prefixes. Only those months'
+            prefixes are listed, so the upload does not slow down as history grows.
+            """,
+        )
+
+        load_raw_table = SnowflakeParallelCopyOperator(
+            task_id="load_raw_table",
+            dates="{{ task_instance.xcom_pull(task_ids='wait_for_tlc_publication', key='return_value') or '' }}",
+            doc_md="""
+            ### Copy Data from Stage into Raw Table
+
+            Submits one asynchronous COPY INTO per month prefix (year=YYYY/month=MM/) to load new Parquet files into the raw
+            HVFHV_TRIPS table, with several running concurrently, then defers to the triggerer, which polls
+            them by query ID. The task only resumes on a worker to log per-file results and row counts
+            and to submit the next COPY, so no worker slot is held for the whole load.
+            """,
+        )
+
+        check_for_new_data >> wait_for_tlc_publication >> download_data >> upload_data_to_stage >> load_raw_table
+        data_loaded = load_raw_table
+
+    manifest = load_manifest(Path(DBT_MANIFEST_PATH)) if DBT_EXECUTION_MODE == "per_model" else None
+
+    if manifest:
+        # One task group per model (run, then tests), wired by the model graph.
+        dbt_roots = build_dbt_task_groups(manifest, cwd=CWD)
+
+        dbt_source_tests = BashOperator(
+            task_id="dbt_source_tests",
+            cwd=CWD,
+            bash_command=dbt_bash_command("test --select 'source:*'", "target/airflow/source_tests"),
+            doc_md="""
+            ### Validate Raw Sources
+
+            Runs the dbt tests defined on the raw sources.
+            """,
+        )
+
+        data_loaded >> [dbt_source_tests, *dbt_roots]
+    else:
+        # Default, and fallback when no manifest is available (run `dbt parse` to generate one).
+        dbt_build = PythonOperator(
+            task_id="dbt_build",
+            python_callable=run_dbt_build,
+            doc_md="""
+            ### Build and Test with dbt
+
+            Invokes dbt programmatically (dbtRunner) in a single process: the project is parsed
+            once and the manifest is reused, then one `dbt build` interleaves seeds, models and
+            their tests (not_null, unique, relationships, etc.). Models downstream of a failing
+            test are skipped, so bi_* marts are never built on a fact table that failed its tests.
+            The number of dbt threads is tuned from previous runs by the concurrency controller.
+            """,
+        )
+
+        data_loaded >> dbt_build
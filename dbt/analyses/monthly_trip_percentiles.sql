@@ -0,0 +1,18 @@
+-- Example rollup of the daily sketches to months. Any date range works the
+-- same way; only the sketch rows for that range are read.
+
+SELECT
+  DATE_TRUNC('month', date_key) AS month,
+  SUM(total_trips) AS total_trips,
+  {{ merge_percentile('passenger_fare_digest', 0.5) }} AS median_passenger_fare,
+  {{ merge_percentile('passenger_fare_digest', 0.9) }} AS p90_passenger_fare,
+  {{ merge_percentile('driver_pay_digest', 0.5) }} AS median_driver_pay,
+  {{ merge_percentile('driver_pay_digest', 0.9) }} AS p90_driver_pay,
+  {{ merge_percentile('trip_time_digest', 0.5) }} AS median_trip_time_seconds,
+  {{ merge_percentile('trip_time_digest', 0.9) }} AS p90_trip_time_seconds,
+  {{ merge_percentile('wait_time_digest', 0.5) }} AS median_wait_time_seconds,
+  {{ merge_percentile('wait_time_digest', 0.9) }} AS p90_wait_time_seconds,
+  {{ merge_distinct_count('zone_pair_hll') }} AS distinct_zone_pairs
+FROM {{ ref('bi_trip_sketches') }}
+GROUP BY 1
+ORDER BY 1
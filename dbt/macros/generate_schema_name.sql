@@ -1,6 +1,8 @@
 {% macro generate_schema_name(custom_schema_name, node) %}
   {% if custom_schema_name is none %}
     {{ target.schema }}
+  {% elif target.name == 'sample' %}
+    {{ custom_schema_name | upper }}_SAMPLE
   {% else %}
     {{ custom_schema_name | upper }}
   {% endif %}
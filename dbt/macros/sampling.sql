@@ -0,0 +1,21 @@
+{# Deterministic hash-based sampling for fast development builds. #}
+
+{% macro sample_pct() %}
+  {%- set pct = var('sample_pct') -%}
+  {%- if pct is none -%}
+    {%- set pct = 10 if target.name == 'sample' else 100 -%}
+  {%- endif -%}
+  {{ return(pct | float) }}
+{% endmacro %}
+
+{% macro sample_filter(columns) %}
+  {%- if sample_pct() < 100 -%}
+  and mod(abs(hash({{ columns | join(', ') }})), 10000) < {{ (sample_pct() * 100) | int }}
+  {%- endif -%}
+{% endmacro %}
+
+{% macro sample_scale() %}
+  {%- if var('sample_scale_up') and sample_pct() < 100 -%}
+  * {{ 100.0 / sample_pct() }}
+  {%- endif -%}
+{% endmacro %}
@@ -0,0 +1,9 @@
+{# Helpers to merge the per-day sketches stored in bi_trip_sketches. #}
+
+{% macro merge_percentile(digest_column, percentile) %}
+  APPROX_PERCENTILE_ESTIMATE(APPROX_PERCENTILE_COMBINE({{ digest_column }}), {{ percentile }})
+{% endmacro %}
+
+{% macro merge_distinct_count(hll_column) %}
+  HLL_ESTIMATE(HLL_COMBINE(HLL_IMPORT({{ hll_column }})))
+{% endmacro %}
@@ -7,24 +7,24 @@
 
 SELECT
   dd.date_key,
-  COUNT(*) AS total_trips,
-  SUM(trip_miles) AS total_trip_miles,
-  SUM(trip_time) / (3600 * 24) AS total_trip_time_days,
+  COUNT(*) {{ sample_scale() }} AS total_trips,
+  SUM(trip_miles) {{ sample_scale() }} AS total_trip_miles,
+  SUM(trip_time) / (3600 * 24) {{ sample_scale() }} AS total_trip_time_days,
   SUM(
     base_passenger_fare + tips + tolls + airport_fee + congestion_surcharge + cbd_congestion_fee + sales_tax + bcf
-  ) AS passenger_total_spend,
+  ) {{ sample_scale() }} AS passenger_total_spend,
   SUM(
     base_passenger_fare + congestion_surcharge + cbd_congestion_fee
-  ) AS platform_gross_revenue,
-  SUM(driver_pay + tips) AS driver_total_earnings,
+  ) {{ sample_scale() }} AS platform_gross_revenue,
+  SUM(driver_pay + tips) {{ sample_scale() }} AS driver_total_earnings,
   SUM(
     sales_tax + bcf + congestion_surcharge + cbd_congestion_fee + airport_fee
-  ) AS fees_and_taxes,
+  ) {{ sample_scale() }} AS fees_and_taxes,
   SUM(
     (
       base_passenger_fare + congestion_surcharge + cbd_congestion_fee
     ) - driver_pay
-  ) AS platform_net_earnings,
+  ) {{ sample_scale() }} AS platform_net_earnings,
   SUM(
     CASE
       WHEN pf.shared_match_flag THEN 1
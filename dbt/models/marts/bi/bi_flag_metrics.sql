@@ -7,37 +7,37 @@
 
 SELECT 
   dd.date_key,
-  COUNT(*) AS total_trips,
+  COUNT(*) {{ sample_scale() }} AS total_trips,
   SUM(
     CASE
       WHEN shared_request_flag THEN 1
       ELSE 0
     END
-  ) AS total_shared_rides_requested,
+  ) {{ sample_scale() }} AS total_shared_rides_requested,
   SUM(
     CASE
       WHEN shared_match_flag THEN 1
       ELSE 0
     END
-  ) AS total_shared_rides_matched,
+  ) {{ sample_scale() }} AS total_shared_rides_matched,
   SUM(
     CASE
       WHEN wav_request_flag THEN 1
       ELSE 0
     END
-  ) AS total_wav_requested,
+  ) {{ sample_scale() }} AS total_wav_requested,
   SUM(
     CASE
       WHEN wav_match_flag THEN 1
       ELSE 0
     END
-  ) AS total_wav_matched,
+  ) {{ sample_scale() }} AS total_wav_matched,
   SUM(
     CASE
       WHEN access_a_ride_flag THEN 1
       ELSE 0
     END
-  ) AS total_access_a_ride_requested
+  ) {{ sample_scale() }} AS total_access_a_ride_requested
 FROM {{ ref('fact_trips') }}
  ft
   JOIN {{ ref('dim_datetime') }}
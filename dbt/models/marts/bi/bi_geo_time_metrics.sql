@@ -17,7 +17,7 @@ SELECT
   do.borough as do_borough,
   do.zone as do_zone,
 
-  COUNT(*) AS trip_count,
+  COUNT(*) {{ sample_scale() }} AS trip_count,
   AVG(trip_miles) AS avg_trip_miles,
   AVG(trip_time) AS avg_trip_time,
   AVG(base_passenger_fare) AS avg_passenger_fare,
@@ -0,0 +1,29 @@
+{{ 
+  config(
+    materialized = 'incremental',
+    unique_key='date_key'
+  ) 
+}}
+
+-- Mergeable per-day sketches: t-digest states for percentiles and HLL states
+-- for distinct counts. Combine them over any date range with the macros in
+-- macros/sketches.sql instead of rescanning fact_trips.
+
+SELECT
+  dd.date_key,
+  COUNT(*) {{ sample_scale() }} AS total_trips,
+  APPROX_PERCENTILE_ACCUMULATE(base_passenger_fare) AS passenger_fare_digest,
+  APPROX_PERCENTILE_ACCUMULATE(driver_pay) AS driver_pay_digest,
+  APPROX_PERCENTILE_ACCUMULATE(trip_time) AS trip_time_digest,
+  APPROX_PERCENTILE_ACCUMULATE(
+    DATEDIFF('second', ft.request_datetime, ft.pickup_datetime)
+  ) AS wait_time_digest,
+  HLL_EXPORT(
+    HLL_ACCUMULATE(ft.pulocation_id * 1000 + ft.dolocation_id)
+  ) AS zone_pair_hll
+FROM {{ ref('fact_trips') }} ft
+JOIN {{ ref('dim_datetime') }} dd ON DATE_TRUNC('hour', ft.pickup_datetime) = dd.full_timestamp
+{% if is_incremental() %}
+WHERE dd.date_key not in (select date_key from {{ this }})
+{% endif %}
+GROUP BY dd.date_key
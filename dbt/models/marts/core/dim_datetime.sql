@@ -9,8 +9,8 @@
 WITH date_spine AS (
   {{ dbt_utils.date_spine(
     datepart = "hour",
-    start_date = " (SELECT DATE_TRUNC('hour', MIN(pickup_datetime)) FROM " ~ ref('stg_uber_trips') ~ ") ",
-    end_date = " (SELECT DATE_TRUNC('hour', MAX(pickup_datetime)) + INTERVAL '1 hour' FROM " ~ ref('stg_uber_trips') ~ ") "
+    start_date = " (SELECT DATE_TRUNC('hour', MIN(pickup_datetime)) FROM " ~ ref('fact_trips') ~ ") ",
+    end_date = " (SELECT DATE_TRUNC('hour', MAX(pickup_datetime)) + INTERVAL '1 hour' FROM " ~ ref('fact_trips') ~ ") "
   ) }}
 ),
 holidays AS (
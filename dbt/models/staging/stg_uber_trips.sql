@@ -47,4 +47,5 @@ join max_ingestion on ingestion_ts > max_ingestion_ts
 {% endif %}
 where hvfhs_license_num = 'HV0003' -- Uber HVFHS
   and pickup_datetime is not null 
-  and dropoff_datetime is not null
\ No newline at end of file
+  and dropoff_datetime is not null
+  {{ sample_filter(['pickup_datetime', 'dropoff_datetime']) }}
\ No newline at end of file
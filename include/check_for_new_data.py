@@ -2,8 +2,7 @@ import os
 import sys
 import argparse
 import logging
-from pathlib import Path
-from typing import Set
+from typing import Iterable, Set
 
 import snowflake.connector
 from snowflake.connector.errors import ProgrammingError
@@ -19,33 +18,51 @@ SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
 WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
 DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
 SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
-STAGE_NAME = os.getenv("SNOWFLAKE_STAGE", f"{DATABASE}.{SCHEMA}.FHV_INTERNAL_STAGE")
+
+# Months are present once their trips are in these tables, not merely once their files are staged,
+# so a month whose COPY or INSERT failed after its PUT is picked up again on the next run.
+RAW_TABLE = f"{DATABASE}.{SCHEMA}.FHV_TRIPS"
+FACT_TABLE = os.getenv("SNOWFLAKE_FACT_TABLE", f"{DATABASE}.MARTS.FACT_TRIPS")
 
 # --- Data Configuration ---
 BASE_FILENAME = "{year}-{month:02d}.parquet"
 DEFAULT_YEAR_RANGE = os.getenv('DATA_YEAR_RANGE', '2025-2026')
+# Monthly files carry a few trips picked up in neighbouring months; a month needs at least this
+# many trips to count as loaded, so those strays never mark an unloaded month as present.
+MIN_LOADED_MONTH_ROWS = int(os.getenv("MIN_LOADED_MONTH_ROWS", "1000"))
+# "Object does not exist", e.g. before the first load of a fresh deployment.
+OBJECT_DOES_NOT_EXIST = 2003
 
-def list_files_in_stage(cursor, stage_name: str) -> Set[str]:
+def list_loaded_months(cursor, tables: Iterable[str], years: Iterable[int], min_rows: int = MIN_LOADED_MONTH_ROWS) -> Set[str]:
     """
-    Lists files in a given Snowflake stage and returns a set of normalized filenames,
-    stripping the '.gz' extension if present.
+    Returns the normalized 'YYYY-MM.parquet' filenames of the months of the given years that
+    have at least min_rows trips by pickup_datetime in any of the given tables. Only the
+    requested years are scanned, and the tables are clustered by pickup date, so the cost
+    does not grow with total history. A table that does not exist yet has no loaded months.
     """
-    logging.info(f"Listing files in stage '{stage_name}'...")
-    try:
-        cursor.execute(f"LIST @{stage_name};")
-        staged_files_raw = cursor.fetchall()
-        staged_files_normalized = set()
-        for row in staged_files_raw:
-            staged_filename = Path(row[0]).name
-            if staged_filename.endswith(".gz"):
-                staged_files_normalized.add(staged_filename[:-3])
-            else:
-                staged_files_normalized.add(staged_filename)
-        logging.info(f"Found {len(staged_files_normalized)} unique files (normalized) in stage.")
-        return staged_files_normalized
-    except ProgrammingError as e:
-        logging.error(f"Error listing files in stage {stage_name}: {e}")
-        return set()
+    years = list(years)
+    loaded = set()
+    for table in tables:
+        logging.info(f"Listing loaded months in '{table}'...")
+        try:
+            cursor.execute(
+                f"""
+                SELECT YEAR(pickup_datetime), MONTH(pickup_datetime)
+                FROM {table}
+                WHERE pickup_datetime >= '{min(years)}-01-01' AND pickup_datetime < '{max(years) + 1}-01-01'
+                GROUP BY 1, 2
+                HAVING COUNT(*) >= {min_rows};
+                """
+            )
+            rows = cursor.fetchall()
+        except ProgrammingError as e:
+            if e.errno != OBJECT_DOES_NOT_EXIST:
+                raise
+            logging.warning(f"Table '{table}' does not exist yet; no months loaded there.")
+            continue
+        loaded.update(BASE_FILENAME.format(year=int(year), month=int(month)) for year, month in rows)
+    logging.info(f"Found {len(loaded)} loaded month(s).")
+    return loaded
 
 
 def set_github_action_output(name: str, value: str):
@@ -57,7 +74,7 @@ def set_github_action_output(name: str, value: str):
 
 def main():
     """
-    Checks if data files for a given date range already exist in the Snowflake stage
+    Checks if the months of a given date range are already loaded in Snowflake
     and sets a GitHub Action output 'download_needed' to 'true' or 'false', and
     'missing_dates' to a comma-separated list of YYYY-MM dates.
     """
@@ -70,6 +87,13 @@ def main():
         help=f"Year range for parquet files, e.g., '2020-2024'. Defaults to {DEFAULT_YEAR_RANGE}.",
     )
     parser.add_argument("--months", type=str, default="1-12", help="Month range for parquet files, e.g., '1-12'.")
+    parser.add_argument(
+        "--etl-mode",
+        choices=["warehouse", "local"],
+        default="warehouse",
+        help="'warehouse' checks the raw table. 'local' also checks the fact table, which the local "
+             "ETL mode loads directly, so months loaded by either path count as present.",
+    )
     args = parser.parse_args()
 
     # --- Generate Target File List ---
@@ -92,7 +116,7 @@ def main():
         logging.error("Snowflake credentials (SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT) are not set.")
         sys.exit(1)
 
-    # --- Compare with Staged Files ---
+    # --- Compare with Loaded Months ---
     try:
         with snowflake.connector.connect(
             user=SNOWFLAKE_USER,
@@ -104,16 +128,17 @@ def main():
         ) as conn:
             logging.info("Successfully connected to Snowflake.")
             cs = conn.cursor()
-            staged_files = list_files_in_stage(cs, STAGE_NAME)
+            tables = [RAW_TABLE, FACT_TABLE] if args.etl_mode == "local" else [RAW_TABLE]
+            loaded_files = list_loaded_months(cs, tables, range(year_start, year_end + 1))
     except Exception as e:
-        logging.error(f"Failed to connect to Snowflake and list staged files: {e}")
+        logging.error(f"Failed to connect to Snowflake and list loaded months: {e}")
         sys.exit(1)
 
     # Find the difference
-    missing_files = target_files - staged_files
+    missing_files = target_files - loaded_files
 
     if not missing_files:
-        logging.info("All target files already exist in the Snowflake stage. No download needed.")
+        logging.info("All target months are already loaded. No download needed.")
         set_github_action_output("download_needed", "false")
         set_github_action_output("missing_dates", "")
     else:
@@ -0,0 +1,238 @@
+import os
+import json
+import math
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import snowflake.connector
+from snowflake.connector.errors import Error
+
+# --- Configuration ---
+# 'snowflake' shares state between all workers through a small table; 'file' keeps it on local disk.
+STATE_BACKEND = os.getenv("CONCURRENCY_STATE_BACKEND", "snowflake")
+STATE_PATH = Path(os.getenv("CONCURRENCY_STATE_PATH", "/usr/local/airflow/data/concurrency_state.json"))
+
+# --- Snowflake Configuration ---
+SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
+SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
+SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
+WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
+DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
+SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
+STATE_TABLE = os.getenv("CONCURRENCY_STATE_TABLE", f"{DATABASE}.{SCHEMA}.CONCURRENCY_STATE")
+
+# cgroup v2 and v1 CPU quota files, read to size containerized workers.
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+# Per-stage starting point, additive increase step and configured ceiling.
+STAGES = {
+    "download": {"initial": 2, "step": 1, "ceiling": int(os.getenv("MAX_DOWNLOAD_CONCURRENCY", "8"))},
+    "put": {"initial": 16, "step": 4, "ceiling": int(os.getenv("MAX_PUT_PARALLEL", "64"))},
+    "copy": {"initial": 4, "step": 1, "ceiling": int(os.getenv("MAX_COPY_CONCURRENCY", "8"))},
+    "dbt": {"initial": 8, "step": 2, "ceiling": int(os.getenv("MAX_DBT_THREADS", "16"))},
+}
+# Throughput must drop by more than this fraction before it counts as congestion.
+THROUGHPUT_TOLERANCE = 0.1
+DECREASE_FACTOR = 0.5
+
+log = logging.getLogger(__name__)
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """Returns the CPU limit set by the container's cgroup quota, or None if there is none."""
+    try:
+        if CGROUP_V2_CPU_MAX.exists():
+            quota, period = CGROUP_V2_CPU_MAX.read_text().split()[:2]
+            return None if quota == "max" else int(quota) / int(period)
+        if CGROUP_V1_CPU_QUOTA.exists():
+            quota = int(CGROUP_V1_CPU_QUOTA.read_text())
+            return None if quota <= 0 else quota / int(CGROUP_V1_CPU_PERIOD.read_text())
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read the cgroup CPU quota: {e}")
+    return None
+
+
+def available_cpus() -> int:
+    """
+    Returns the number of CPUs this process may actually use. os.cpu_count() reports the
+    host's cores inside containers, so the CPU affinity mask and the cgroup quota are used.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on every platform, e.g. macOS.
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+class FileStateStore:
+    """Keeps controller state in a local JSON file. Only suitable for a single worker."""
+
+    def __init__(self, path: Path = STATE_PATH):
+        self.path = path
+
+    def _read(self) -> Dict[str, dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            log.warning(f"Could not read concurrency state {self.path}, starting fresh: {e}")
+            return {}
+
+    def load(self, key: str) -> Optional[dict]:
+        return self._read().get(key)
+
+    def save(self, key: str, entry: dict):
+        state = self._read()
+        state[key] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write atomically so concurrently running tasks never read a partial file.
+        with tempfile.NamedTemporaryFile("w", dir=self.path.parent, delete=False) as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(f.name, self.path)
+
+
+class SnowflakeStateStore:
+    """
+    Keeps controller state in a Snowflake table, so that every worker of the fleet reads and
+    updates the same history, and it survives worker restarts. Each stage and worker size is
+    one row, updated with a MERGE so concurrent tasks never overwrite each other's stages.
+    """
+
+    def __init__(self, table: str = STATE_TABLE):
+        self.table = table
+
+    def _execute(self, sql_text: str, params: tuple):
+        with snowflake.connector.connect(
+            user=SNOWFLAKE_USER,
+            password=SNOWFLAKE_PASSWORD,
+            account=SNOWFLAKE_ACCOUNT,
+            warehouse=WAREHOUSE,
+            database=DATABASE,
+            schema=SCHEMA
+        ) as conn:
+            cs = conn.cursor()
+            cs.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                state_key VARCHAR,
+                concurrency INT,
+                last_concurrency INT,
+                throughput FLOAT,
+                updated_at TIMESTAMP_LTZ
+            );
+            """)
+            cs.execute(sql_text, params)
+            return cs.fetchone()
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            row = self._execute(
+                f"SELECT concurrency, last_concurrency, throughput FROM {self.table} WHERE state_key = %s;",
+                (key,),
+            )
+        except Error as e:
+            log.warning(f"Could not read concurrency state from {self.table}, using defaults: {e}")
+            return None
+        if row is None:
+            return None
+        return {"concurrency": row[0], "last_concurrency": row[1], "throughput": row[2]}
+
+    def save(self, key: str, entry: dict):
+        try:
+            self._execute(
+                f"""
+                MERGE INTO {self.table} t
+                USING (SELECT %s AS state_key, %s AS concurrency, %s AS last_concurrency, %s AS throughput) s
+                ON t.state_key = s.state_key
+                WHEN MATCHED THEN UPDATE SET
+                    concurrency = s.concurrency,
+                    last_concurrency = s.last_concurrency,
+                    throughput = s.throughput,
+                    updated_at = CURRENT_TIMESTAMP()
+                WHEN NOT MATCHED THEN INSERT (state_key, concurrency, last_concurrency, throughput, updated_at)
+                    VALUES (s.state_key, s.concurrency, s.last_concurrency, s.throughput, CURRENT_TIMESTAMP());
+                """,
+                (key, entry["concurrency"], entry["last_concurrency"], entry["throughput"]),
+            )
+        except Error as e:
+            log.warning(f"Could not save concurrency state to {self.table}: {e}")
+
+
+def default_state_store():
+    """Returns the shared Snowflake store, or the local file store if configured or without credentials."""
+    if STATE_BACKEND == "snowflake" and all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
+        return SnowflakeStateStore()
+    return FileStateStore()
+
+
+class ConcurrencyController:
+    """
+    AIMD-style concurrency controller fed by recorded throughput.
+
+    Each stage's concurrency is increased additively after a run whose throughput held up,
+    and cut multiplicatively after a run with errors or a throughput drop. State is kept per
+    worker size (usable CPUs), since workers of different sizes settle on different levels.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or default_state_store()
+        self.worker_key = f"{available_cpus()}cpu"
+
+    def _key(self, stage: str) -> str:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'. Expected one of {sorted(STAGES)}.")
+        return f"{stage}@{self.worker_key}"
+
+    def recommend(self, stage: str) -> int:
+        """Returns the concurrency to use for the next run of the given stage."""
+        key = self._key(stage)
+        config = STAGES[stage]
+        entry = self.store.load(key)
+        concurrency = entry["concurrency"] if entry else config["initial"]
+        return max(1, min(concurrency, config["ceiling"]))
+
+    def record(self, stage: str, concurrency: int, units: float, seconds: float, errors: int = 0) -> int:
+        """
+        Records a run of the given stage and returns the concurrency for the next run.
+
+        Args:
+            stage (str): One of the configured stages, e.g. 'download'.
+            concurrency (int): The concurrency the run used.
+            units (float): Amount of work done, e.g. bytes or rows.
+            seconds (float): Wall-clock duration of the run.
+            errors (int): Number of failed units of work (files, batches, models).
+        """
+        key = self._key(stage)
+        config = STAGES[stage]
+        entry = self.store.load(key) or {}
+        throughput = units / seconds if seconds > 0 else 0.0
+        last_throughput = entry.get("throughput")
+
+        if errors:
+            next_concurrency = int(concurrency * DECREASE_FACTOR)
+            reason = f"{errors} error(s)"
+        elif last_throughput and throughput < last_throughput * (1 - THROUGHPUT_TOLERANCE):
+            next_concurrency = int(concurrency * DECREASE_FACTOR)
+            reason = f"throughput dropped from {last_throughput:,.1f} to {throughput:,.1f}/s"
+        else:
+            next_concurrency = concurrency + config["step"]
+            reason = f"throughput {throughput:,.1f}/s"
+        next_concurrency = max(1, min(next_concurrency, config["ceiling"]))
+
+        self.store.save(key, {
+            "concurrency": next_concurrency,
+            "last_concurrency": concurrency,
+            "throughput": throughput,
+        })
+        log.info(f"Concurrency for '{stage}': {concurrency} -> {next_concurrency} ({reason}).")
+        return next_concurrency
+
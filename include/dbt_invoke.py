@@ -0,0 +1,72 @@
+import os
+import time
+import logging
+from typing import List, Optional
+
+from airflow.exceptions import AirflowException
+
+from include.concurrency import ConcurrencyController
+
+DBT_PROJECT_DIR = os.getenv("DBT_PROJECT_DIR", "/usr/local/airflow/dbt")
+
+log = logging.getLogger(__name__)
+
+
+class DbtInvoker:
+    """
+    Runs dbt commands programmatically in the current process.
+
+    The project is parsed once and the resulting manifest is reused by every later
+    invocation, so dbt does not re-parse the project or restart between commands.
+    Parsing also refreshes target/partial_parse.msgpack, which keeps the next task's
+    parse incremental.
+    """
+
+    def __init__(self, project_dir: str = DBT_PROJECT_DIR):
+        # Imported here so that parsing the DAG file does not pay for importing dbt.
+        from dbt.cli.main import dbtRunner
+
+        self.project_dir = project_dir
+        parse_result = dbtRunner().invoke(["parse", *self._common_args()])
+        if not parse_result.success:
+            raise AirflowException(f"dbt parse failed: {parse_result.exception}")
+        self.runner = dbtRunner(manifest=parse_result.result)
+
+    def _common_args(self) -> List[str]:
+        return ["--project-dir", self.project_dir, "--profiles-dir", self.project_dir]
+
+    def invoke(self, args: List[str]):
+        """Runs a dbt command, e.g. ['build', '--select', 'fact_trips+'], and returns its dbtRunnerResult."""
+        log.info(f"Running dbt {' '.join(args)}")
+        return self.runner.invoke([*args, *self._common_args()])
+
+
+def run_dbt_build(select: Optional[str] = None):
+    """
+    Runs a single `dbt build` in-process. Models, seeds and their tests are interleaved
+    in DAG order, so a model whose upstream test fails is skipped rather than built on
+    bad data. dbt threads are tuned from previous runs by the concurrency controller.
+    """
+    controller = ConcurrencyController()
+    threads = controller.recommend("dbt")
+
+    args = ["build", "--threads", str(threads)]
+    if select:
+        args += ["--select", select]
+
+    start = time.monotonic()
+    result = DbtInvoker().invoke(args)
+    elapsed = time.monotonic() - start
+
+    if result.exception:
+        raise AirflowException(f"dbt build raised an exception: {result.exception}")
+
+    node_results = result.result.results
+    failed = [r.node.unique_id for r in node_results if str(r.status) in ("error", "fail")]
+    skipped = [r.node.unique_id for r in node_results if str(r.status) == "skipped"]
+    controller.record("dbt", threads, len(node_results), elapsed, errors=len(failed))
+
+    if skipped:
+        log.warning(f"{len(skipped)} node(s) skipped because of upstream failures: {skipped}")
+    if not result.success:
+        raise AirflowException(f"dbt build failed for {len(failed)} node(s): {failed}")
@@ -0,0 +1,109 @@
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from airflow.providers.standard.operators.bash import BashOperator
+from airflow.sdk import TaskGroup
+
+log = logging.getLogger(__name__)
+
+# Written by `dbt parse` (and every in-process dbt build) in the project's default target path.
+PARTIAL_PARSE_FILE = "target/partial_parse.msgpack"
+
+
+def load_manifest(manifest_path: Path) -> Optional[dict]:
+    """
+    Loads a dbt manifest.json, returning None if it does not exist or cannot be parsed
+    so that the DAG can fall back to monolithic dbt tasks.
+    """
+    if not manifest_path.exists():
+        log.warning(f"dbt manifest not found at {manifest_path}.")
+        return None
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (IOError, ValueError) as e:
+        log.warning(f"Could not read dbt manifest {manifest_path}: {e}")
+        return None
+
+
+def get_model_graph(manifest: dict) -> Tuple[Dict[str, str], Dict[str, List[str]], Dict[str, bool]]:
+    """
+    Extracts the model dependency graph from a dbt manifest.
+
+    Returns:
+        A tuple of (model unique_id -> model name, model unique_id -> upstream model unique_ids,
+        model unique_id -> whether any test depends on the model).
+    """
+    nodes = manifest.get("nodes", {})
+    models = {uid: node["name"] for uid, node in nodes.items() if node.get("resource_type") == "model"}
+
+    upstream = {
+        uid: sorted(dep for dep in nodes[uid].get("depends_on", {}).get("nodes", []) if dep in models)
+        for uid in models
+    }
+
+    has_tests = {uid: False for uid in models}
+    for node in nodes.values():
+        if node.get("resource_type") != "test":
+            continue
+        for dep in node.get("depends_on", {}).get("nodes", []):
+            if dep in has_tests:
+                has_tests[dep] = True
+
+    return models, upstream, has_tests
+
+
+def dbt_bash_command(args: str, target_path: str, project_dir: str = "dbt") -> str:
+    """
+    Returns a bash command running `dbt <args>` with its own target path, so concurrently
+    running tasks do not overwrite each other's artifacts. The project's partial_parse.msgpack
+    is copied into that target path first, so the task parses incrementally instead of parsing
+    the whole project.
+    """
+    return (
+        f"cd {project_dir} && mkdir -p {target_path} "
+        f"&& if [ -f {PARTIAL_PARSE_FILE} ]; then cp {PARTIAL_PARSE_FILE} {target_path}/; fi "
+        f"&& dbt {args} --target-path {target_path}"
+    )
+
+
+def build_dbt_task_groups(manifest: dict, cwd: str, project_dir: str = "dbt") -> List[TaskGroup]:
+    """
+    Creates one task group per dbt model, each running the model followed by its tests,
+    and wires the groups according to the model graph. Must be called inside a DAG context.
+
+    Every task uses its own dbt target path, seeded with the shared partial parse, see
+    dbt_bash_command.
+
+    Returns:
+        The root groups, i.e. models without upstream models.
+    """
+    models, upstream, has_tests = get_model_graph(manifest)
+
+    groups = {}
+    for uid, name in sorted(models.items(), key=lambda item: item[1]):
+        with TaskGroup(group_id=name, tooltip=uid) as group:
+            run = BashOperator(
+                task_id="run",
+                cwd=cwd,
+                bash_command=dbt_bash_command(f"run --select {name}", f"target/airflow/{name}/run", project_dir),
+            )
+            if has_tests[uid]:
+                # 'buildable' only picks tests whose other parents are already built upstream.
+                test = BashOperator(
+                    task_id="test",
+                    cwd=cwd,
+                    bash_command=dbt_bash_command(
+                        f"test --select {name} --indirect-selection buildable", f"target/airflow/{name}/test", project_dir
+                    ),
+                )
+                run >> test
+        groups[uid] = group
+
+    for uid, parents in upstream.items():
+        for parent in parents:
+            groups[parent] >> groups[uid]
+
+    return [groups[uid] for uid in groups if not upstream[uid]]
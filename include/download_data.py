@@ -1,10 +1,16 @@
 import os
+import sys
+import time
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 import requests
 from tqdm import tqdm
 
+from concurrency import ConcurrencyController
+
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -12,20 +18,24 @@ BASE_URL_PARQUET = "https://d37ci6vzurychx.cloudfront.net/trip-data/fhvhv_tripda
 BASE_URL_CSV = "https://d37ci6vzurychx.cloudfront.net/misc/taxi_zone_lookup.csv"
 DEFAULT_YEAR_RANGE = os.getenv('DATA_YEAR_RANGE', '2025-2026')
 
-def download_file(url: str, local_path: Path):
+def download_file(url: str, local_path: Path) -> Optional[int]:
     """
     Downloads a file from a URL to a local path with a progress bar, skipping if it already exists.
 
     Args:
         url (str): The URL of the file to download.
         local_path (Path): The local path to save the file.
+
+    Returns:
+        The number of bytes downloaded (0 if skipped), or None if the download failed.
     """
     local_path.parent.mkdir(parents=True, exist_ok=True)
     
     if local_path.exists():
         logging.info(f"File already exists, skipping: {local_path}")
-        return
+        return 0
     
+    downloaded = 0
     try:
         logging.info(f"Downloading {url} to {local_path}")
         with requests.get(url, stream=True, timeout=30) as r:
@@ -37,8 +47,13 @@ def download_file(url: str, local_path: Path):
                 for chunk in r.iter_content(chunk_size=8192):
                     f.write(chunk)
                     pbar.update(len(chunk))
+                    downloaded += len(chunk)
+        return downloaded
     except requests.exceptions.RequestException as e:
         logging.error(f"Error downloading {url}: {e}")
+        # A partial file would be skipped as already downloaded on the next run.
+        local_path.unlink(missing_ok=True)
+        return None
 
 def update_csv_header(csv_path: Path):
     """
@@ -123,12 +138,29 @@ def main():
             logging.error(f"Invalid range format for years ('{args.years}') or months ('{args.months}'). Please use 'start-end'.")
             return
 
-    # Download all determined parquet files
+    # Download all determined parquet files concurrently, with concurrency tuned from previous runs
+    controller = ConcurrencyController()
+    concurrency = controller.recommend("download")
+    downloads = []
     for year, month in files_to_download:
         url = BASE_URL_PARQUET.format(year=year, month=month)
         local_path = Path('/usr/local/airflow/',"data", "parquet", str(year), f"{year}-{month:02d}.parquet")
-        download_file(url, local_path)
+        downloads.append((url, local_path))
+
+    logging.info(f"Downloading {len(downloads)} file(s) with {concurrency} concurrent download(s).")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda d: download_file(*d), downloads))
+
+    # A single download does not exercise concurrency, so it tells the controller nothing.
+    downloaded_bytes = sum(r for r in results if r)
+    if sum(1 for r in results if r) > 1 or None in results:
+        controller.record("download", concurrency, downloaded_bytes, time.monotonic() - start, errors=results.count(None))
 
+    failed = results.count(None)
+    if failed:
+        logging.error(f"{failed} of {len(downloads)} download(s) failed.")
+        sys.exit(1)
     logging.info("Download process completed.")
 
 if __name__ == "__main__":
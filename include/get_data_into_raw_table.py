@@ -1,28 +1,25 @@
-import os
 import sys
+import time
+import argparse
 import logging
-import snowflake.connector
 from snowflake.connector.errors import ProgrammingError
 
+from concurrency import ConcurrencyController
+from raw_table import (
+    CREATE_TABLE_SQL,
+    TABLE_NAME,
+    collect_copies,
+    connect,
+    finished_queries,
+    list_staged_batches,
+    log_load_totals,
+    new_copy_state,
+    submit_copies,
+)
+
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Fetch credentials from environment variables
-SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
-SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
-SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
-WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
-DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
-SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
-TABLE_NAME = "FHV_TRIPS"
-STAGE_NAME = os.getenv("SNOWFLAKE_STAGE", f"{DATABASE}.{SCHEMA}.FHV_INTERNAL_STAGE")
-FILE_FORMAT_NAME = os.getenv("SNOWFLAKE_FILE_FORMAT", f"{DATABASE}.{SCHEMA}.FHV_PARQUET_FORMAT")
-
-# Check for required environment variables
-if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
-    logging.error("Error: SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, and SNOWFLAKE_PASSWORD must be set.")
-    sys.exit(1)
-
 def execute_sql(cursor, sql_text: str, success_msg: str = ""):
     """Executes a single SQL statement."""
     try:
@@ -33,90 +30,80 @@ def execute_sql(cursor, sql_text: str, success_msg: str = ""):
         logging.error(f"Error executing SQL:\n{sql_text}\n{e}")
         raise
 
+def run_parallel_copies(conn, state: dict, poll_interval: float):
+    """
+    Runs a parallel load to completion in the foreground: the same submit and collect steps
+    as the deferrable load_raw_table task, polling from this process instead of the triggerer.
+    """
+    submit_copies(conn, state)
+    while state["running"]:
+        time.sleep(poll_interval)
+        finished = finished_queries(conn, list(state["running"]))
+        if finished:
+            collect_copies(conn, state, finished)
+            submit_copies(conn, state)
+    log_load_totals(state)
+
+def parse_args():
+    """Parses command-line arguments for the script."""
+    parser = argparse.ArgumentParser(
+        description="Load staged Parquet files into the raw Snowflake table, e.g. for a manual backfill. "
+                    "The DAG runs the same load deferred, see snowflake_copy.py."
+    )
+    parser.add_argument(
+        "--dates",
+        type=str,
+        required=True,
+        help="Comma-separated list of months to load, e.g., '2024-01,2024-03'. Only the stage "
+             "prefixes of these months are listed and loaded; there is no whole-stage load.",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=None,
+        help="Maximum number of COPY statements running at once. "
+             "Defaults to the level tuned from previous loads by the concurrency controller.",
+    )
+    parser.add_argument("--batch-size", type=int, default=1, help="Files per COPY. Defaults to 1.")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="Seconds between status checks. Defaults to 10.")
+    return parser.parse_args()
+
 def main():
     """Connects to Snowflake, creates the raw table, and loads data from the stage."""
+    args = parse_args()
+    dates = [d.strip() for d in args.dates.split(",") if d.strip()]
+    if not dates:
+        logging.info("No dates to load.")
+        return
+
     try:
-        with snowflake.connector.connect(
-            user=SNOWFLAKE_USER,
-            password=SNOWFLAKE_PASSWORD,
-            account=SNOWFLAKE_ACCOUNT,
-            warehouse=WAREHOUSE,
-            database=DATABASE,
-            schema=SCHEMA
-        ) as conn:
+        with connect() as conn:
             logging.info("Successfully connected to Snowflake.")
             cs = conn.cursor()
 
             # --- Setup: Create Table ---
             logging.info("-- Setting up Snowflake objects --")
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                hvfhs_license_num VARCHAR(6),
-                request_datetime TIMESTAMP_NTZ,
-                on_scene_datetime TIMESTAMP_NTZ,
-                pickup_datetime TIMESTAMP_NTZ,
-                dropoff_datetime TIMESTAMP_NTZ,
-                PULocationID NUMBER(3),
-                DOLocationID NUMBER(3),
-                trip_miles FLOAT,
-                trip_time NUMBER,
-                base_passenger_fare FLOAT,
-                tolls FLOAT,
-                bcf FLOAT,
-                sales_tax FLOAT,
-                congestion_surcharge FLOAT,
-                airport_fee FLOAT,
-                tips FLOAT,
-                driver_pay FLOAT,
-                cbd_congestion_fee FLOAT DEFAULT 0,
-                shared_request_flag BOOLEAN,
-                shared_match_flag BOOLEAN,
-                access_a_ride_flag BOOLEAN,
-                wav_request_flag BOOLEAN,
-                wav_match_flag BOOLEAN,
-                -- metadata
-                ingestion_ts TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP
-            )
-            CLUSTER BY (TO_DATE(pickup_datetime));
-            """
-            execute_sql(cs, create_table_sql, f"Table '{TABLE_NAME}' ensured.")
+            execute_sql(cs, CREATE_TABLE_SQL, f"Table '{TABLE_NAME}' ensured.")
 
             # --- Load Data from Stage ---
             logging.info("-- Starting data load from stage --")
-            copy_sql = f"""
-            COPY INTO {TABLE_NAME} FROM (
-                SELECT
-                    $1:hvfhs_license_num::VARCHAR(6),                                                                                   
-                    $1:request_datetime::TIMESTAMP_NTZ,                                                                                    
-                    $1:on_scene_datetime::TIMESTAMP_NTZ,                                                                                   
-                    $1:pickup_datetime::TIMESTAMP_NTZ,                                                                                     
-                    $1:dropoff_datetime::TIMESTAMP_NTZ,                                                                                    
-                    $1:PULocationID::INT,                                                                                 
-                    $1:DOLocationID::INT,                                                                                              
-                    $1:trip_miles::FLOAT,                                                                                              
-                    $1:trip_time::INT,                                                                                                 
-                    $1:base_passenger_fare::FLOAT,
-                    $1:tolls::FLOAT,
-                    $1:bcf::FLOAT,
-                    $1:sales_tax::FLOAT,
-                    $1:congestion_surcharge::FLOAT,
-                    $1:airport_fee::FLOAT,
-                    $1:tips::FLOAT,
-                    $1:driver_pay::FLOAT,
-                    $1:cbd_congestion_fee::FLOAT,
-                    $1:shared_request_flag::STRING,
-                    $1:shared_match_flag::STRING,
-                    $1:access_a_ride_flag::STRING,
-                    $1:wav_request_flag::STRING,
-                    $1:wav_match_flag::STRING,
-                    CURRENT_TIMESTAMP() AS ingestion_ts
-                FROM @{STAGE_NAME}
-            )
-            PATTERN = '.*\.parquet'
-            FILE_FORMAT = (FORMAT_NAME = {FILE_FORMAT_NAME})
-            ON_ERROR = 'SKIP_FILE';
-            """
-            execute_sql(cs, copy_sql, "Successfully loaded data from stage into raw table.")
+            batches = list_staged_batches(cs, dates, args.batch_size)
+            if not batches:
+                logging.info("No staged files to load.")
+                return
+            controller = ConcurrencyController()
+            max_concurrent = args.max_concurrent or controller.recommend("copy")
+            logging.info(f"Loading {len(batches)} batch(es) with up to {max_concurrent} concurrent COPY statements.")
+            state = new_copy_state(batches, max_concurrent)
+            run_parallel_copies(conn, state, args.poll_interval)
+            failed_batches = state["failed_batches"]
+            if len(batches) > 1:
+                controller.record(
+                    "copy", max_concurrent, state["totals"]["rows_loaded"], time.time() - state["started"], errors=failed_batches
+                )
+            if failed_batches:
+                logging.error(f"{failed_batches} COPY batch(es) failed.")
+                sys.exit(1)
 
             logging.info("-- Data loading process completed. --")
 
@@ -0,0 +1,458 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import snowflake.connector
+from snowflake.connector.errors import ProgrammingError
+
+from concurrency import ConcurrencyController, available_cpus
+from raw_table import CREATE_TABLE_SQL as CREATE_RAW_TABLE_SQL
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Fetch credentials from environment variables
+SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
+SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
+SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
+WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
+DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
+SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
+STAGE_NAME = os.getenv("SNOWFLAKE_STAGE", f"{DATABASE}.{SCHEMA}.FHV_INTERNAL_STAGE")
+FILE_FORMAT_NAME = os.getenv("SNOWFLAKE_FILE_FORMAT", f"{DATABASE}.{SCHEMA}.FHV_PARQUET_FORMAT")
+FACT_TABLE = os.getenv("SNOWFLAKE_FACT_TABLE", f"{DATABASE}.MARTS.FACT_TRIPS")
+# Session-scoped table each month is copied into before being merged into the fact table.
+LOAD_TABLE = "FACT_TRIPS_LOAD"
+
+DATA_DIR = Path("/usr/local/airflow/data/parquet")
+OUTPUT_DIR = Path("/usr/local/airflow/data/transformed")
+# Transformed files are staged apart from the raw files, see upload_data.py for the layout.
+TRANSFORMED_STAGE_PREFIX = "transformed/year={year}/month={month:02d}/"
+
+# --- Transform Configuration (mirrors stg_uber_trips and fact_trips) ---
+UBER_LICENSE = "HV0003"
+# Placeholder dbt_utils.generate_surrogate_key substitutes for NULL inputs.
+SURROGATE_KEY_NULL = "_dbt_utils_surrogate_key_null_"
+TIMESTAMP_COLUMNS = ["request_datetime", "on_scene_datetime", "pickup_datetime", "dropoff_datetime"]
+LOCATION_COLUMNS = {"PULocationID": "pulocation_id", "DOLocationID": "dolocation_id"}
+MEASURE_COLUMNS = {
+    "trip_miles": pa.float64(),
+    "trip_time": pa.int64(),
+    "base_passenger_fare": pa.float64(),
+    "tolls": pa.float64(),
+    "bcf": pa.float64(),
+    "sales_tax": pa.float64(),
+    "congestion_surcharge": pa.float64(),
+    "airport_fee": pa.float64(),
+    "tips": pa.float64(),
+    "driver_pay": pa.float64(),
+    "cbd_congestion_fee": pa.float64(),
+}
+FLAG_COLUMNS = ["shared_request_flag", "shared_match_flag", "access_a_ride_flag", "wav_request_flag", "wav_match_flag"]
+SOURCE_COLUMNS = ["hvfhs_license_num", *TIMESTAMP_COLUMNS, *LOCATION_COLUMNS, *MEASURE_COLUMNS, *FLAG_COLUMNS]
+
+FACT_SCHEMA = pa.schema(
+    [("trip_id", pa.string())]
+    + [(c, pa.timestamp("us")) for c in TIMESTAMP_COLUMNS]
+    + [(c, pa.int64()) for c in LOCATION_COLUMNS.values()]
+    + list(MEASURE_COLUMNS.items())
+    + [("trip_flags_id", pa.string())]
+)
+
+def _flag_key_lookup() -> np.ndarray:
+    """
+    Precomputes trip_flags_id for every combination of the five flags. Each flag is encoded
+    as an integer state (0=false, 1=true, 2=null) and a combination as sum(state * 3**i),
+    so per-row keys become a single array lookup instead of an md5 per row.
+    """
+    names = ["false", "true", SURROGATE_KEY_NULL]
+    lookup = np.empty(3 ** len(FLAG_COLUMNS), dtype=object)
+    for code in range(len(lookup)):
+        states = [(code // 3 ** i) % 3 for i in range(len(FLAG_COLUMNS))]
+        lookup[code] = hashlib.md5("-".join(names[s] for s in states).encode()).hexdigest()
+    return lookup
+
+FLAG_KEY_LOOKUP = _flag_key_lookup()
+
+def snowflake_timestamp_strings(ts: pa.Array) -> pa.Array:
+    """
+    Formats timestamps the way Snowflake casts TIMESTAMP_NTZ to VARCHAR
+    ('YYYY-MM-DD HH24:MI:SS.FF3', sub-millisecond digits truncated), which is what the
+    surrogate keys are hashed from. Arrow's millisecond string cast produces exactly that format.
+    """
+    return ts.cast(pa.timestamp("ms"), safe=False).cast(pa.string())
+
+def trip_ids(pickup: pa.Array, dropoff: pa.Array) -> pa.Array:
+    """
+    Computes dbt_utils.generate_surrogate_key(['pickup_datetime', 'dropoff_datetime']).
+
+    The key strings are built with vectorized Arrow kernels, but neither Arrow nor NumPy has
+    an md5 kernel, so the digest itself is one hashlib call per row: about 0.8M rows/s per
+    core, more than half of a row group's transform time. Row groups are spread across
+    processes so that this loop scales with the worker's cores.
+    """
+    key_inputs = pc.binary_join_element_wise(
+        snowflake_timestamp_strings(pickup), snowflake_timestamp_strings(dropoff), "-"
+    )
+    md5 = hashlib.md5
+    return pa.array([md5(k).hexdigest() for k in key_inputs.cast(pa.binary()).to_pylist()], pa.string())
+
+def trip_flag_ids(table: pa.Table) -> pa.Array:
+    """Computes fact_trips.trip_flags_id from the raw 'Y'/'N' flag columns."""
+    codes = np.zeros(table.num_rows, dtype=np.int64)
+    for i, column in enumerate(FLAG_COLUMNS):
+        if column in table.column_names:
+            values = table[column]
+            is_true = pc.fill_null(pc.equal(values, "Y"), False).to_numpy(zero_copy_only=False)
+            is_false = pc.fill_null(pc.equal(values, "N"), False).to_numpy(zero_copy_only=False)
+            states = np.where(is_true, 1, np.where(is_false, 0, 2))
+        else:
+            states = np.full(table.num_rows, 2)
+        codes += states * 3 ** i
+    return pa.array(FLAG_KEY_LOOKUP[codes], pa.string())
+
+def build_fact_table(table: pa.Table) -> pa.Table:
+    """Applies the stg_uber_trips filters and produces the fact_trips columns."""
+    keep = pc.and_(
+        pc.equal(table["hvfhs_license_num"], UBER_LICENSE),
+        pc.and_(pc.is_valid(table["pickup_datetime"]), pc.is_valid(table["dropoff_datetime"])),
+    )
+    table = table.filter(keep).combine_chunks()
+
+    columns = [trip_ids(table["pickup_datetime"], table["dropoff_datetime"])]
+    for column in TIMESTAMP_COLUMNS:
+        columns.append(table[column].cast(pa.timestamp("us")))
+    for column in LOCATION_COLUMNS:
+        columns.append(table[column].cast(pa.int64()))
+    for column, dtype in MEASURE_COLUMNS.items():
+        # Older months predate some fees (e.g. cbd_congestion_fee); the raw load leaves them NULL.
+        if column in table.column_names:
+            columns.append(table[column].cast(dtype))
+        else:
+            columns.append(pa.nulls(table.num_rows, dtype))
+    columns.append(trip_flag_ids(table))
+    return pa.Table.from_arrays(columns, schema=FACT_SCHEMA)
+
+def transform_row_group(source: str, row_group: int, destination: str) -> Tuple[int, int]:
+    """
+    Transforms a single row group of a raw monthly file into a fact-ready Parquet part.
+    Only one row group is held in memory at a time.
+
+    Returns:
+        A tuple of (rows read, rows written).
+    """
+    parquet_file = pq.ParquetFile(source, memory_map=True)
+    columns = [c for c in SOURCE_COLUMNS if c in parquet_file.schema_arrow.names]
+    table = parquet_file.read_row_group(row_group, columns=columns)
+    fact = build_fact_table(table)
+    if fact.num_rows:
+        pq.write_table(fact, destination)
+    return table.num_rows, fact.num_rows
+
+def parse_dates(dates: str) -> List[Tuple[int, int]]:
+    """Parses a comma-separated list of YYYY-MM dates into (year, month) tuples."""
+    parsed = []
+    for date_str in dates.split(","):
+        date_str = date_str.strip()
+        if not date_str:
+            continue
+        try:
+            year, month = map(int, date_str.split("-"))
+            parsed.append((year, month))
+        except ValueError:
+            logging.warning(f"Skipping invalid date format: '{date_str}'")
+    return parsed
+
+def month_output_dir(year: int, month: int) -> Path:
+    return OUTPUT_DIR / str(year) / f"{year}-{month:02d}"
+
+def transform(dates: List[Tuple[int, int]], workers: int) -> bool:
+    """
+    Transforms the given months in parallel across processes, one task per row group.
+
+    Returns:
+        True if every row group was transformed, False otherwise.
+    """
+    tasks = []
+    for year, month in dates:
+        source = DATA_DIR / str(year) / f"{year}-{month:02d}.parquet"
+        if not source.exists():
+            logging.warning(f"Local file not found, skipping: {source}")
+            continue
+        output_dir = month_output_dir(year, month)
+        # Start clean so parts from a previous run never mix with this one.
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir(parents=True)
+        for row_group in range(pq.ParquetFile(source).num_row_groups):
+            tasks.append((str(source), row_group, str(output_dir / f"part-{row_group:05d}.parquet")))
+
+    if not tasks:
+        logging.info("No local files to transform.")
+        return True
+
+    logging.info(f"Transforming {len(tasks)} row group(s) with {workers} worker process(es).")
+    start = time.monotonic()
+    rows_read = rows_written = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(transform_row_group, *task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            source, row_group, _ = futures[future]
+            try:
+                read, written = future.result()
+                rows_read += read
+                rows_written += written
+            except Exception as e:
+                logging.error(f"Failed to transform row group {row_group} of {source}: {e}")
+                failed += 1
+            if done % 10 == 0 or done == len(tasks):
+                logging.info(f"Progress: {done}/{len(tasks)} row groups, {rows_written:,} rows written.")
+
+    elapsed = time.monotonic() - start
+    logging.info(
+        f"Transformed {rows_read:,} rows into {rows_written:,} fact rows in {elapsed:.0f}s "
+        f"({rows_read / max(elapsed, 1e-9):,.0f} rows/s); {failed} row group(s) failed."
+    )
+    return failed == 0
+
+def connect():
+    """Opens a Snowflake connection, exiting if credentials are missing."""
+    if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
+        logging.error("Error: SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, and SNOWFLAKE_PASSWORD must be set.")
+        sys.exit(1)
+    return snowflake.connector.connect(
+        user=SNOWFLAKE_USER,
+        password=SNOWFLAKE_PASSWORD,
+        account=SNOWFLAKE_ACCOUNT,
+        warehouse=WAREHOUSE,
+        database=DATABASE,
+        schema=SCHEMA
+    )
+
+def ensure_fact_table(cursor):
+    """
+    Creates the fact table with the fact_trips columns if dbt has not built it yet.
+    dbt then maintains it incrementally like its own.
+    """
+    if "." in FACT_TABLE:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {FACT_TABLE.rsplit('.', 1)[0]};")
+    columns = ",\n".join(f"{field.name} {snowflake_type(field.type)}" for field in FACT_SCHEMA)
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {FACT_TABLE} (
+    {columns}
+    )
+    CLUSTER BY (pickup_datetime);
+    """)
+
+def load(dates: List[Tuple[int, int]]):
+    """
+    PUTs the transformed parts of each month into the stage, copies them into a temporary
+    table and inserts the trips whose trip_id is not yet in the fact table, like the
+    incremental filter of fact_trips. Months already loaded by dbt or by an earlier run
+    are therefore never duplicated.
+    """
+    controller = ConcurrencyController()
+    parallel = controller.recommend("put")
+    columns = ", ".join(FACT_SCHEMA.names)
+    with connect() as conn:
+        logging.info("Successfully connected to Snowflake.")
+        cs = conn.cursor()
+        # Local mode never loads the raw table, but stg_uber_trips and the source tests still
+        # read it; an empty one lets dbt build the dimensions and marts on a fresh deployment.
+        cs.execute(CREATE_RAW_TABLE_SQL)
+        ensure_fact_table(cs)
+        for year, month in dates:
+            output_dir = month_output_dir(year, month)
+            if not any(output_dir.glob("*.parquet")):
+                logging.warning(f"No transformed files for {year}-{month:02d}, skipping.")
+                continue
+
+            prefix = TRANSFORMED_STAGE_PREFIX.format(year=year, month=month)
+            # Use POSIX path for cross-platform compatibility in Snowflake URIs
+            normalized_path = str(output_dir.resolve()).replace("\\", "/")
+            try:
+                cs.execute(f"PUT file://{normalized_path}/*.parquet @{STAGE_NAME}/{prefix} AUTO_COMPRESS=FALSE PARALLEL={parallel};")
+            except ProgrammingError as e:
+                # Per Snowflake docs, a "no results" error (253005) is expected on successful PUT.
+                if e.errno != 253005:
+                    raise
+            logging.info(f"Uploaded transformed files for {year}-{month:02d} to '{prefix}'.")
+
+            # A fresh temporary table per month, so COPY's load history never skips a re-run.
+            cs.execute(f"CREATE OR REPLACE TEMPORARY TABLE {LOAD_TABLE} LIKE {FACT_TABLE};")
+            select_list = ",\n".join(f"$1:{field.name}::{snowflake_type(field.type)}" for field in FACT_SCHEMA)
+            copy_sql = f"""
+            COPY INTO {LOAD_TABLE} ({columns}) FROM (
+                SELECT
+                {select_list}
+                FROM @{STAGE_NAME}/{prefix}
+            )
+            FILE_FORMAT = (FORMAT_NAME = {FILE_FORMAT_NAME})
+            ON_ERROR = 'ABORT_STATEMENT';
+            """
+            cs.execute(copy_sql)
+            rows_loaded = sum(row[3] for row in cs.fetchall() if len(row) >= 4)
+
+            cs.execute(f"""
+            INSERT INTO {FACT_TABLE} ({columns})
+            SELECT {columns}
+            FROM {LOAD_TABLE}
+            WHERE trip_id NOT IN (SELECT trip_id FROM {FACT_TABLE});
+            """)
+            rows_inserted = cs.fetchone()[0]
+            logging.info(
+                f"Loaded {rows_loaded:,} rows for {year}-{month:02d}; inserted {rows_inserted:,} new trips "
+                f"into {FACT_TABLE}, skipped {rows_loaded - rows_inserted:,} already present."
+            )
+
+def snowflake_type(dtype: pa.DataType) -> str:
+    """Maps the fact schema's Arrow types to the Snowflake casts used when loading."""
+    if pa.types.is_timestamp(dtype):
+        return "TIMESTAMP_NTZ"
+    if pa.types.is_integer(dtype):
+        return "INT"
+    if pa.types.is_floating(dtype):
+        return "FLOAT"
+    return "VARCHAR"
+
+def local_month_summary(year: int, month: int) -> Dict[str, float]:
+    """
+    Summarizes the transformed trips picked up in the given month, one part at a time.
+    The trip_id checksum is the sum of the first 15 hex digits of every key, which is
+    order-independent and can be computed the same way in Snowflake.
+    """
+    start = pa.scalar(datetime(year, month, 1), pa.timestamp("us"))
+    end = pa.scalar(datetime(year + month // 12, month % 12 + 1, 1), pa.timestamp("us"))
+    summary = {"trips": 0, "trip_id_checksum": 0, "base_passenger_fare": 0.0, "driver_pay": 0.0}
+    for part in sorted(month_output_dir(year, month).glob("*.parquet")):
+        table = pq.read_table(part, columns=["trip_id", "pickup_datetime", "base_passenger_fare", "driver_pay"])
+        in_month = pc.and_(pc.greater_equal(table["pickup_datetime"], start), pc.less(table["pickup_datetime"], end))
+        table = table.filter(in_month)
+        summary["trips"] += table.num_rows
+        summary["trip_id_checksum"] += sum(int(t[:15], 16) for t in table["trip_id"].to_pylist())
+        summary["base_passenger_fare"] += pc.sum(table["base_passenger_fare"]).as_py() or 0.0
+        summary["driver_pay"] += pc.sum(table["driver_pay"]).as_py() or 0.0
+    return summary
+
+def verify(dates: List[Tuple[int, int]], table_name: str, tolerance: float) -> bool:
+    """
+    Checks the local output against a warehouse table built by the dbt models for the same
+    months (row count, trip_id checksum and fare/pay totals).
+
+    Returns:
+        True if every month matches, False otherwise.
+    """
+    all_match = True
+    with connect() as conn:
+        cs = conn.cursor()
+        for year, month in dates:
+            local = local_month_summary(year, month)
+            cs.execute(f"""
+            SELECT
+                COUNT(*),
+                SUM(TO_NUMBER(LEFT(trip_id, 15), 'XXXXXXXXXXXXXXX')),
+                SUM(base_passenger_fare),
+                SUM(driver_pay)
+            FROM {table_name}
+            WHERE pickup_datetime >= DATE_FROM_PARTS({year}, {month}, 1)
+              AND pickup_datetime < DATEADD('month', 1, DATE_FROM_PARTS({year}, {month}, 1));
+            """)
+            trips, checksum, fare, pay = cs.fetchone()
+            warehouse = {
+                "trips": trips,
+                "trip_id_checksum": int(checksum or 0),
+                "base_passenger_fare": float(fare or 0.0),
+                "driver_pay": float(pay or 0.0),
+            }
+
+            mismatches = []
+            for key, local_value in local.items():
+                warehouse_value = warehouse[key]
+                if isinstance(local_value, float):
+                    matches = abs(local_value - warehouse_value) <= tolerance * max(abs(warehouse_value), 1.0)
+                else:
+                    matches = local_value == warehouse_value
+                if not matches:
+                    mismatches.append(f"{key}: local={local_value} warehouse={warehouse_value}")
+
+            if mismatches:
+                all_match = False
+                logging.error(f"{year}-{month:02d} does not match {table_name}: " + "; ".join(mismatches))
+            else:
+                logging.info(f"{year}-{month:02d} matches {table_name} ({local['trips']:,} trips).")
+    return all_match
+
+def parse_args():
+    """Parses command-line arguments for the script."""
+    parser = argparse.ArgumentParser(
+        description="Transform raw HVFHV Parquet files into fact-ready Parquet locally, load and verify them."
+    )
+    parser.add_argument("command", choices=["transform", "load", "verify"])
+    parser.add_argument(
+        "--dates",
+        type=str,
+        required=True,
+        help="A comma-separated list of months to process, e.g., '2024-01,2024-03'.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=available_cpus(),
+        help="Worker processes for transform. Defaults to the number of CPUs available to this worker.",
+    )
+    parser.add_argument(
+        "--table",
+        type=str,
+        default=FACT_TABLE,
+        help=f"Warehouse table built by dbt to verify against. Defaults to {FACT_TABLE}.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-6,
+        help="Relative tolerance for floating-point totals in verify. Defaults to 1e-6.",
+    )
+    return parser.parse_args()
+
+def main():
+    """
+    Optional local ETL mode. 'transform' streams each month's file one row group at a time
+    and produces the fact_trips columns (stg_uber_trips filters, surrogate keys and flag keys);
+    'load' copies them straight into the fact table; 'verify' compares the local output
+    with the warehouse-built fact table.
+    """
+    args = parse_args()
+    dates = parse_dates(args.dates)
+    if not dates:
+        logging.info("No dates to process.")
+        return
+
+    try:
+        if args.command == "transform":
+            succeeded = transform(dates, args.workers)
+        elif args.command == "load":
+            load(dates)
+            succeeded = True
+        else:
+            succeeded = verify(dates, args.table, args.tolerance)
+    except ProgrammingError as e:
+        logging.error(f"A database error occurred: {e}")
+        sys.exit(1)
+
+    if not succeeded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
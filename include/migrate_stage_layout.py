@@ -0,0 +1,107 @@
+import os
+import sys
+import argparse
+import logging
+from typing import Dict, List
+
+import snowflake.connector
+from snowflake.connector.errors import ProgrammingError
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Fetch credentials from environment variables
+SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
+SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
+SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
+WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
+DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
+SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
+STAGE_NAME = os.getenv("SNOWFLAKE_STAGE", f"{DATABASE}.{SCHEMA}.FHV_INTERNAL_STAGE")
+# Files are staged under Hive-style prefixes, see upload_data.py.
+STAGE_PREFIX = "year={year}/month={month:02d}/"
+
+# Check for required environment variables
+if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
+    logging.error("Error: SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, and SNOWFLAKE_PASSWORD must be set.")
+    sys.exit(1)
+
+def list_flat_files(cursor, stage_name: str) -> Dict[str, List[str]]:
+    """
+    Lists the 'YYYY-MM.parquet' files stored directly in the stage root and groups them
+    by their target 'year=YYYY/month=MM/' prefix. Files already under a prefix are ignored.
+    """
+    cursor.execute(f"LIST @{stage_name};")
+    files_by_prefix = {}
+    for row in cursor.fetchall():
+        # LIST returns '<stage>/<path>'; drop the stage name component.
+        relative_path = row[0].split("/", 1)[1]
+        if "/" in relative_path:
+            continue
+        try:
+            year, month = map(int, relative_path.split(".")[0].split("-"))
+        except ValueError:
+            logging.warning(f"Skipping file with unexpected name: '{relative_path}'")
+            continue
+        files_by_prefix.setdefault(STAGE_PREFIX.format(year=year, month=month), []).append(relative_path)
+    return files_by_prefix
+
+def main():
+    """
+    Moves flat files in the stage root into the 'year=YYYY/month=MM/' layout.
+
+    Snowflake tracks COPY load history by file path, so moved files look new to COPY.
+    They are already in the raw table, which is why the loaders only ever COPY the
+    months they are given (get_data_into_raw_table.py --dates ...).
+
+    check_for_new_data.py decides which months are missing from the raw and fact tables,
+    not from the stage, so months loaded from flat files are never staged or loaded again
+    whether or not this has run; it keeps uploads and COPY listing only the months they process.
+    """
+    parser = argparse.ArgumentParser(description="Migrate a flat Snowflake stage to the year=YYYY/month=MM/ layout.")
+    parser.add_argument("--dry-run", action="store_true", help="Only log the files that would be moved.")
+    args = parser.parse_args()
+
+    try:
+        with snowflake.connector.connect(
+            user=SNOWFLAKE_USER,
+            password=SNOWFLAKE_PASSWORD,
+            account=SNOWFLAKE_ACCOUNT,
+            warehouse=WAREHOUSE,
+            database=DATABASE,
+            schema=SCHEMA
+        ) as conn:
+            logging.info("Successfully connected to Snowflake.")
+            cs = conn.cursor()
+
+            files_by_prefix = list_flat_files(cs, STAGE_NAME)
+            if not files_by_prefix:
+                logging.info("No flat files found in the stage root. Nothing to migrate.")
+                return
+
+            logging.info(f"Found {sum(map(len, files_by_prefix.values()))} flat file(s) to migrate.")
+            for prefix, files in sorted(files_by_prefix.items()):
+                file_list = ", ".join(f"'{f}'" for f in files)
+                if args.dry_run:
+                    logging.info(f"Would move {file_list} to '{prefix}'.")
+                    continue
+
+                cs.execute(f"COPY FILES INTO @{STAGE_NAME}/{prefix} FROM @{STAGE_NAME} FILES = ({file_list});")
+                for f in files:
+                    cs.execute(f"REMOVE @{STAGE_NAME}/{f};")
+                logging.info(f"Moved {file_list} to '{prefix}'.")
+
+            logging.info("--- Stage migration completed. ---")
+
+    except ProgrammingError as e:
+        logging.error(f"A database error occurred: {e}")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+    finally:
+        logging.info("Snowflake connection closed.")
+
+
+if __name__ == "__main__":
+    main()
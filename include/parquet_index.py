@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# --- Configuration ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DATA_DIR = Path(os.getenv("PARQUET_DATA_DIR", "/usr/local/airflow/data/parquet"))
+INDEX_SUFFIX = ".zonemap.json"
+INDEXED_COLUMNS = ["pickup_datetime", "PULocationID", "DOLocationID"]
+
+def index_path_for(parquet_path: Path) -> Path:
+    """Returns the sidecar index path, e.g. '2024-01.parquet.zonemap.json'."""
+    return parquet_path.with_name(parquet_path.name + INDEX_SUFFIX)
+
+def _stat_value(value):
+    """Makes a Parquet statistics value JSON-serializable."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def build_index(parquet_path: Path) -> dict:
+    """
+    Builds the zone map of a Parquet file from its footer only: per row group, the row count
+    and the min/max of every indexed column. Missing statistics are stored as null, which
+    queries treat as 'may match'.
+    """
+    metadata = pq.ParquetFile(parquet_path, memory_map=True).metadata
+    column_positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+
+    row_groups = []
+    for rg_index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_index)
+        entry = {"row_group": rg_index, "num_rows": row_group.num_rows}
+        for column in INDEXED_COLUMNS:
+            stats = None
+            if column in column_positions:
+                stats = row_group.column(column_positions[column]).statistics
+            if stats is not None and stats.has_min_max:
+                entry[column] = [_stat_value(stats.min), _stat_value(stats.max)]
+            else:
+                entry[column] = None
+        row_groups.append(entry)
+
+    stat = parquet_path.stat()
+    return {
+        "file": parquet_path.name,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "row_groups": row_groups,
+    }
+
+def load_index(parquet_path: Path) -> Optional[dict]:
+    """Loads the sidecar index of a Parquet file, or returns None if it is missing or stale."""
+    path = index_path_for(parquet_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (IOError, ValueError) as e:
+        logging.warning(f"Could not read index {path}: {e}")
+        return None
+    stat = parquet_path.stat()
+    if index.get("size") != stat.st_size or index.get("mtime") != stat.st_mtime:
+        return None
+    return index
+
+def build_indexes(data_dir: Path, rebuild: bool = False) -> int:
+    """
+    Writes a sidecar index next to every Parquet file under data_dir that lacks a current one.
+    A file that cannot be read is logged and skipped, so it does not block indexing the rest.
+
+    Returns:
+        The number of files that could not be indexed.
+    """
+    built = 0
+    failed = 0
+    for parquet_path in sorted(data_dir.rglob("*.parquet")):
+        if not rebuild and load_index(parquet_path) is not None:
+            continue
+        try:
+            index = build_index(parquet_path)
+            with open(index_path_for(parquet_path), "w") as f:
+                json.dump(index, f, indent=2)
+        except (OSError, pa.ArrowException) as e:
+            logging.error(f"Could not index {parquet_path}: {e}")
+            failed += 1
+            continue
+        logging.info(f"Indexed {parquet_path.name}: {len(index['row_groups'])} row groups.")
+        built += 1
+    logging.info(f"Built {built} index(es) under {data_dir}, {failed} failed.")
+    return failed
+
+def _parse_datetimes(bounds: Optional[list]) -> Optional[list]:
+    """Converts ISO-formatted [min, max] timestamp bounds back to datetimes."""
+    return [datetime.fromisoformat(b) for b in bounds] if bounds else None
+
+def _overlaps(bounds: Optional[list], low, high) -> bool:
+    """Returns False only if the [min, max] bounds provably fall outside [low, high)."""
+    if bounds is None:
+        return True
+    bound_min, bound_max = bounds
+    if low is not None and bound_max < low:
+        return False
+    if high is not None and bound_min >= high:
+        return False
+    return True
+
+def matching_row_groups(
+    data_dir: Path,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    pu_zone: Optional[int] = None,
+    do_zone: Optional[int] = None,
+) -> Dict[Path, List[int]]:
+    """
+    Uses the sidecar indexes to find the row groups that may contain trips picked up in
+    [start, end) with the given pickup and dropoff zones. Files without a current index
+    are indexed on the fly from their footer; files that cannot be read are skipped.
+    """
+    matches = {}
+    for parquet_path in sorted(data_dir.rglob("*.parquet")):
+        try:
+            index = load_index(parquet_path) or build_index(parquet_path)
+        except (OSError, pa.ArrowException) as e:
+            logging.warning(f"Skipping unreadable file {parquet_path}: {e}")
+            continue
+        row_groups = [
+            rg["row_group"]
+            for rg in index["row_groups"]
+            if _overlaps(_parse_datetimes(rg["pickup_datetime"]), start, end)
+            and (pu_zone is None or _overlaps(rg["PULocationID"], pu_zone, pu_zone + 1))
+            and (do_zone is None or _overlaps(rg["DOLocationID"], do_zone, do_zone + 1))
+        ]
+        if row_groups:
+            matches[parquet_path] = row_groups
+    return matches
+
+def unified_schema(parquet_paths: List[Path]) -> pa.Schema:
+    """
+    Unifies the schemas of the given Parquet files from their footers. Columns missing from
+    some months are kept, and differing types are promoted (e.g. int32 to int64), so months
+    from years with different TLC schemas can be written to a single file.
+    """
+    schemas = [pq.read_schema(p, memory_map=True).remove_metadata() for p in parquet_paths]
+    return pa.unify_schemas(schemas, promote_options="permissive")
+
+def conform_to_schema(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Casts the columns of table to schema, filling the columns it lacks with nulls."""
+    columns = [
+        table[field.name].cast(field.type) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def extract(
+    matches: Dict[Path, List[int]],
+    output_path: Path,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    pu_zone: Optional[int] = None,
+    do_zone: Optional[int] = None,
+) -> int:
+    """
+    Reads only the matching row groups through memory-mapped files, applies the exact
+    filters and writes the result to output_path, using the unified schema of all matching
+    files so that months with different schemas can be combined.
+
+    Returns:
+        The number of rows written.
+    """
+    if not matches:
+        return 0
+    schema = unified_schema(list(matches))
+    writer = None
+    rows_written = 0
+    try:
+        for parquet_path, row_groups in matches.items():
+            parquet_file = pq.ParquetFile(parquet_path, memory_map=True)
+            # One row group at a time keeps memory bounded however many groups match.
+            for row_group in row_groups:
+                table = parquet_file.read_row_group(row_group)
+                pickup = table["pickup_datetime"]
+                mask = pc.is_valid(pickup)
+                if start:
+                    mask = pc.and_(mask, pc.greater_equal(pickup, pa.scalar(start, pickup.type)))
+                if end:
+                    mask = pc.and_(mask, pc.less(pickup, pa.scalar(end, pickup.type)))
+                if pu_zone is not None:
+                    mask = pc.and_(mask, pc.equal(table["PULocationID"], pu_zone))
+                if do_zone is not None:
+                    mask = pc.and_(mask, pc.equal(table["DOLocationID"], do_zone))
+                table = table.filter(mask)
+                if not table.num_rows:
+                    continue
+                if writer is None:
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(output_path, schema)
+                writer.write_table(conform_to_schema(table, schema))
+                rows_written += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+def parse_args():
+    """Parses command-line arguments for the script."""
+    parser = argparse.ArgumentParser(
+        description="Build and query sidecar zone-map indexes over the local Parquet archive."
+    )
+    parser.add_argument("command", choices=["build", "query", "extract"])
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help=f"Parquet archive directory. Defaults to {DATA_DIR}.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild indexes even if they are current.")
+    parser.add_argument("--date", type=str, default=None, help="A single pickup day, e.g., '2024-01-15'. Overrides --start and --end.")
+    parser.add_argument("--start", type=str, default=None, help="Inclusive pickup datetime lower bound, e.g., '2024-01-15T08:00'.")
+    parser.add_argument("--end", type=str, default=None, help="Exclusive pickup datetime upper bound, e.g., '2024-01-15T10:00'.")
+    parser.add_argument("--pu-zone", type=int, default=None, help="Pickup zone (PULocationID).")
+    parser.add_argument("--do-zone", type=int, default=None, help="Dropoff zone (DOLocationID).")
+    parser.add_argument("--output", type=Path, default=None, help="Output Parquet file for extract.")
+    return parser.parse_args()
+
+def main():
+    """Builds indexes, lists matching row groups, or extracts matching trips."""
+    args = parse_args()
+
+    if args.command == "build":
+        build_indexes(args.data_dir, args.rebuild)
+        return
+
+    try:
+        if args.date:
+            start = datetime.fromisoformat(args.date)
+            end = start + timedelta(days=1)
+        else:
+            start = datetime.fromisoformat(args.start) if args.start else None
+            end = datetime.fromisoformat(args.end) if args.end else None
+    except ValueError as e:
+        logging.error(f"Invalid date format: {e}")
+        sys.exit(1)
+
+    matches = matching_row_groups(args.data_dir, start, end, args.pu_zone, args.do_zone)
+    total = sum(len(rgs) for rgs in matches.values())
+    logging.info(f"{total} matching row group(s) in {len(matches)} file(s).")
+
+    if args.command == "query":
+        for parquet_path, row_groups in matches.items():
+            print(f"{parquet_path}: {','.join(map(str, row_groups))}")
+        return
+
+    if args.output is None:
+        logging.error("--output is required for extract.")
+        sys.exit(1)
+    rows = extract(matches, args.output, start, end, args.pu_zone, args.do_zone)
+    logging.info(f"Wrote {rows:,} rows to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
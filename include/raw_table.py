@@ -0,0 +1,231 @@
+import os
+import time
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+import snowflake.connector
+from snowflake.connector.errors import ProgrammingError
+
+# --- Snowflake Configuration ---
+# Fetch credentials from environment variables
+SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
+SNOWFLAKE_PASSWORD = os.getenv("SNOWFLAKE_PASSWORD")
+SNOWFLAKE_ACCOUNT = os.getenv("SNOWFLAKE_ACCOUNT")
+WAREHOUSE = os.getenv("SNOWFLAKE_WAREHOUSE", "COMPUTE_WH")
+DATABASE = os.getenv("SNOWFLAKE_DATABASE", "FHV_DB")
+SCHEMA = os.getenv("SNOWFLAKE_SCHEMA", "RAW")
+TABLE_NAME = "FHV_TRIPS"
+STAGE_NAME = os.getenv("SNOWFLAKE_STAGE", f"{DATABASE}.{SCHEMA}.FHV_INTERNAL_STAGE")
+FILE_FORMAT_NAME = os.getenv("SNOWFLAKE_FILE_FORMAT", f"{DATABASE}.{SCHEMA}.FHV_PARQUET_FORMAT")
+# Files are staged under Hive-style prefixes, see upload_data.py.
+STAGE_PREFIX = "year={year}/month={month:02d}/"
+
+CREATE_TABLE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    hvfhs_license_num VARCHAR(6),
+    request_datetime TIMESTAMP_NTZ,
+    on_scene_datetime TIMESTAMP_NTZ,
+    pickup_datetime TIMESTAMP_NTZ,
+    dropoff_datetime TIMESTAMP_NTZ,
+    PULocationID NUMBER(3),
+    DOLocationID NUMBER(3),
+    trip_miles FLOAT,
+    trip_time NUMBER,
+    base_passenger_fare FLOAT,
+    tolls FLOAT,
+    bcf FLOAT,
+    sales_tax FLOAT,
+    congestion_surcharge FLOAT,
+    airport_fee FLOAT,
+    tips FLOAT,
+    driver_pay FLOAT,
+    cbd_congestion_fee FLOAT DEFAULT 0,
+    shared_request_flag BOOLEAN,
+    shared_match_flag BOOLEAN,
+    access_a_ride_flag BOOLEAN,
+    wav_request_flag BOOLEAN,
+    wav_match_flag BOOLEAN,
+    -- metadata
+    ingestion_ts TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP
+)
+CLUSTER BY (TO_DATE(pickup_datetime));
+"""
+
+log = logging.getLogger(__name__)
+
+
+def connect():
+    """Opens a Snowflake connection to the raw schema using the credentials from the environment."""
+    if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
+        raise ValueError("SNOWFLAKE_ACCOUNT, SNOWFLAKE_USER, and SNOWFLAKE_PASSWORD must be set.")
+    return snowflake.connector.connect(
+        user=SNOWFLAKE_USER,
+        password=SNOWFLAKE_PASSWORD,
+        account=SNOWFLAKE_ACCOUNT,
+        warehouse=WAREHOUSE,
+        database=DATABASE,
+        schema=SCHEMA
+    )
+
+
+def build_copy_sql(files: List[str], prefix: str) -> str:
+    """
+    Builds the COPY INTO statement for the raw table, loading the given files under a
+    'year=YYYY/month=MM/' stage prefix. Files are always listed explicitly: staged files
+    moved by migrate_stage_layout.py are not in COPY's load history, so a COPY over the
+    whole stage would load them a second time.
+    """
+    file_clause = "FILES = (" + ", ".join(f"'{f}'" for f in files) + ")"
+    return f"""
+    COPY INTO {TABLE_NAME} FROM (
+        SELECT
+            $1:hvfhs_license_num::VARCHAR(6),
+            $1:request_datetime::TIMESTAMP_NTZ,
+            $1:on_scene_datetime::TIMESTAMP_NTZ,
+            $1:pickup_datetime::TIMESTAMP_NTZ,
+            $1:dropoff_datetime::TIMESTAMP_NTZ,
+            $1:PULocationID::INT,
+            $1:DOLocationID::INT,
+            $1:trip_miles::FLOAT,
+            $1:trip_time::INT,
+            $1:base_passenger_fare::FLOAT,
+            $1:tolls::FLOAT,
+            $1:bcf::FLOAT,
+            $1:sales_tax::FLOAT,
+            $1:congestion_surcharge::FLOAT,
+            $1:airport_fee::FLOAT,
+            $1:tips::FLOAT,
+            $1:driver_pay::FLOAT,
+            $1:cbd_congestion_fee::FLOAT,
+            $1:shared_request_flag::STRING,
+            $1:shared_match_flag::STRING,
+            $1:access_a_ride_flag::STRING,
+            $1:wav_request_flag::STRING,
+            $1:wav_match_flag::STRING,
+            CURRENT_TIMESTAMP() AS ingestion_ts
+        FROM @{STAGE_NAME}/{prefix}
+    )
+    {file_clause}
+    FILE_FORMAT = (FORMAT_NAME = {FILE_FORMAT_NAME})
+    ON_ERROR = 'SKIP_FILE';
+    """
+
+
+def list_staged_batches(cursor, dates: List[str], batch_size: int) -> Dict[str, Tuple[str, List[str]]]:
+    """
+    Lists the staged Parquet files of the given YYYY-MM months and groups them into COPY
+    batches of at most batch_size files per month, keyed by a batch label such as '2024-01'
+    or '2024-01#2', with the month's stage prefix. Only the prefixes of those months are listed.
+    """
+    prefixes = []
+    for date_str in dates:
+        year, month = map(int, date_str.split("-"))
+        prefixes.append(STAGE_PREFIX.format(year=year, month=month))
+
+    files_by_prefix = defaultdict(list)
+    for prefix in prefixes:
+        cursor.execute(f"LIST @{STAGE_NAME}/{prefix} PATTERN = '.*\\.parquet';")
+        for row in cursor.fetchall():
+            # LIST returns '<stage>/year=YYYY/month=MM/<file>'; drop the stage name component.
+            relative_path = row[0].split("/", 1)[1]
+            file_prefix, _, filename = relative_path.rpartition("/")
+            files_by_prefix[f"{file_prefix}/"].append(filename)
+
+    batches = {}
+    for prefix in sorted(files_by_prefix):
+        files = sorted(files_by_prefix[prefix])
+        month = files[0].split(".")[0]
+        for i in range(0, len(files), batch_size):
+            label = month if i == 0 else f"{month}#{i // batch_size + 1}"
+            batches[label] = (prefix, files[i:i + batch_size])
+    return batches
+
+
+def summarize_copy_results(label: str, rows) -> Dict[str, int]:
+    """
+    Logs the per-file results of a COPY and returns its file and row counts.
+    COPY returns one row per file: (file, status, rows_parsed, rows_loaded, ...).
+    """
+    summary = {"files_loaded": 0, "files_failed": 0, "rows_loaded": 0}
+    for row in rows:
+        if len(row) < 4:
+            # e.g. "Copy executed with 0 files processed." when every file was already loaded.
+            log.info(f"[{label}] {row[0]}")
+            continue
+        file_name, status, rows_parsed, rows_loaded = row[:4]
+        log.info(f"[{label}] {file_name}: {status}, {rows_loaded:,}/{rows_parsed:,} rows loaded")
+        if status in ("LOADED", "PARTIALLY_LOADED"):
+            summary["files_loaded"] += 1
+            summary["rows_loaded"] += rows_loaded
+        else:
+            summary["files_failed"] += 1
+    return summary
+
+
+def new_copy_state(batches: Dict[str, Tuple[str, List[str]]], max_concurrent: int) -> Dict[str, Any]:
+    """
+    Returns the progress of a parallel load of the given COPY batches. It holds plain JSON
+    types only, so the deferrable operator can hand it back to itself through the metadata
+    database between deferrals.
+    """
+    return {
+        "pending": [[label, prefix, files] for label, (prefix, files) in batches.items()],
+        "running": {},  # query ID -> batch label
+        "totals": {"files_loaded": 0, "files_failed": 0, "rows_loaded": 0},
+        "failed_batches": 0,
+        "total_batches": len(batches),
+        "max_concurrent": max_concurrent,
+        "started": time.time(),
+    }
+
+
+def submit_copies(conn, state: Dict[str, Any]):
+    """Submits pending COPY batches asynchronously until max_concurrent are running."""
+    while state["pending"] and len(state["running"]) < state["max_concurrent"]:
+        label, prefix, files = state["pending"].pop(0)
+        cur = conn.cursor()
+        cur.execute_async(build_copy_sql(files, prefix))
+        state["running"][cur.sfqid] = label
+        log.info(f"Submitted COPY for {label} ({len(files)} file(s)) as query {cur.sfqid}.")
+
+
+def finished_queries(conn, query_ids: List[str]) -> List[str]:
+    """Returns the IDs of the given queries that are no longer running, successfully or not."""
+    return [query_id for query_id in query_ids if not conn.is_still_running(conn.get_query_status(query_id))]
+
+
+def collect_copies(conn, state: Dict[str, Any], query_ids: List[str]):
+    """
+    Collects the results of the given finished COPY queries into the load state, counting a
+    batch as failed if its query failed or any of its files did, and logs the progress.
+    """
+    for query_id in query_ids:
+        label = state["running"].pop(query_id)
+        try:
+            conn.get_query_status_throw_if_error(query_id)
+            cur = conn.cursor()
+            cur.get_results_from_sfqid(query_id)
+            summary = summarize_copy_results(label, cur.fetchall())
+            for key, value in summary.items():
+                state["totals"][key] += value
+            if summary["files_failed"]:
+                state["failed_batches"] += 1
+        except ProgrammingError as e:
+            log.error(f"COPY for {label} (query {query_id}) failed: {e}")
+            state["failed_batches"] += 1
+
+    done = state["total_batches"] - len(state["pending"]) - len(state["running"])
+    log.info(
+        f"Progress: {done}/{state['total_batches']} batches done, {len(state['running'])} running, "
+        f"{state['totals']['rows_loaded']:,} rows loaded in {time.time() - state['started']:.0f}s."
+    )
+
+
+def log_load_totals(state: Dict[str, Any]):
+    """Logs the file and row totals of a finished parallel load."""
+    totals = state["totals"]
+    log.info(
+        f"Loaded {totals['files_loaded']} file(s) and {totals['rows_loaded']:,} rows; "
+        f"{totals['files_failed']} file(s) failed."
+    )
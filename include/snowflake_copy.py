@@ -0,0 +1,141 @@
+import time
+import asyncio
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from airflow.exceptions import AirflowException
+from airflow.sdk import BaseOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+from snowflake.connector.errors import Error
+
+from include.concurrency import ConcurrencyController
+from include.raw_table import (
+    CREATE_TABLE_SQL,
+    collect_copies,
+    connect,
+    finished_queries,
+    list_staged_batches,
+    log_load_totals,
+    new_copy_state,
+    submit_copies,
+)
+from include.tlc_availability import parse_missing_dates
+
+
+class SnowflakeQueryTrigger(BaseTrigger):
+    """
+    Polls the status of asynchronously submitted Snowflake queries until at least one
+    of them has finished (successfully or not), then fires with the finished query IDs.
+
+    Runs on the triggerer, so no worker slot is held while the queries run.
+    """
+
+    def __init__(self, query_ids: Sequence[str], poll_interval: float = 30.0):
+        super().__init__()
+        self.query_ids = list(query_ids)
+        self.poll_interval = poll_interval
+
+    def serialize(self) -> Tuple[str, Dict[str, Any]]:
+        return (
+            "include.snowflake_copy.SnowflakeQueryTrigger",
+            {"query_ids": self.query_ids, "poll_interval": self.poll_interval},
+        )
+
+    def _finished_queries(self) -> List[str]:
+        """Returns the IDs of the queries that are no longer running. Blocking, run in a thread."""
+        with connect() as conn:
+            return finished_queries(conn, self.query_ids)
+
+    async def run(self) -> AsyncIterator[TriggerEvent]:
+        while True:
+            try:
+                finished = await asyncio.to_thread(self._finished_queries)
+            except Error as e:
+                self.log.warning(f"Could not check the status of {len(self.query_ids)} query(ies), retrying: {e}")
+                finished = []
+            if finished:
+                yield TriggerEvent({"status": "success", "finished": finished})
+                return
+            await asyncio.sleep(self.poll_interval)
+
+
+class SnowflakeParallelCopyOperator(BaseOperator):
+    """
+    Loads the staged Parquet files of the given months into the raw table with one
+    asynchronous COPY per month (or file batch), keeping at most max_concurrent running.
+
+    The COPY statements are submitted from the worker, then the task defers to
+    SnowflakeQueryTrigger while they run. Each time a COPY finishes, the task resumes
+    briefly to log its per-file results and submit the next batch, so no worker slot is
+    held for the duration of the load.
+    """
+
+    template_fields = ("dates",)
+
+    def __init__(
+        self,
+        *,
+        dates: str,
+        max_concurrent: Optional[int] = None,
+        batch_size: int = 1,
+        poll_interval: timedelta = timedelta(seconds=30),
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.dates = dates
+        self.max_concurrent = max_concurrent
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    def execute(self, context):
+        dates = parse_missing_dates(self.dates)
+        if not dates:
+            self.log.info("No new dates to load.")
+            return
+
+        with connect() as conn:
+            cs = conn.cursor()
+            cs.execute(CREATE_TABLE_SQL)
+            batches = list_staged_batches(cs, dates, self.batch_size)
+            if not batches:
+                self.log.info("No staged files to load.")
+                return
+
+            max_concurrent = self.max_concurrent or ConcurrencyController().recommend("copy")
+            self.log.info(f"Loading {len(batches)} batch(es) with up to {max_concurrent} concurrent COPY statements.")
+            state = new_copy_state(batches, max_concurrent)
+            submit_copies(conn, state)
+        self._defer(state)
+
+    def _defer(self, state: Dict[str, Any]):
+        self.defer(
+            trigger=SnowflakeQueryTrigger(
+                query_ids=list(state["running"]),
+                poll_interval=self.poll_interval.total_seconds(),
+            ),
+            method_name="execute_complete",
+            kwargs={"state": state},
+        )
+
+    def execute_complete(self, context, event: Dict[str, Any], state: Dict[str, Any]):
+        with connect() as conn:
+            collect_copies(conn, state, event.get("finished", []))
+            submit_copies(conn, state)
+
+        if state["running"]:
+            self._defer(state)
+        self._finish(state)
+
+    def _finish(self, state: Dict[str, Any]):
+        """Logs the load totals, feeds the concurrency controller and fails the task on errors."""
+        log_load_totals(state)
+        if state["total_batches"] > 1:
+            ConcurrencyController().record(
+                "copy",
+                state["max_concurrent"],
+                state["totals"]["rows_loaded"],
+                time.time() - state["started"],
+                errors=state["failed_batches"],
+            )
+        if state["failed_batches"]:
+            raise AirflowException(f"{state['failed_batches']} COPY batch(es) failed.")
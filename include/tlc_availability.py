@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+
+import aiohttp
+from airflow.sdk import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+# --- Data Configuration ---
+BASE_URL_PARQUET = "https://d37ci6vzurychx.cloudfront.net/trip-data/fhvhv_tripdata_{year}-{month:02d}.parquet"
+PROBE_TIMEOUT_SECONDS = 30
+
+log = logging.getLogger(__name__)
+
+
+def parse_missing_dates(missing_dates_output: str) -> List[str]:
+    """
+    Parses the 'missing_dates=YYYY-MM,YYYY-MM' line printed by check_for_new_data.py
+    into a sorted list of YYYY-MM strings. Invalid entries are skipped.
+    """
+    if not missing_dates_output:
+        return []
+    value = missing_dates_output.strip()
+    if value.startswith("missing_dates="):
+        value = value.split("=", 1)[1]
+
+    dates = set()
+    for date_str in value.split(","):
+        date_str = date_str.strip()
+        if not date_str:
+            continue
+        try:
+            year, month = map(int, date_str.split("-"))
+            dates.add(f"{year}-{month:02d}")
+        except ValueError:
+            log.warning(f"Skipping invalid date format: '{date_str}'")
+    return sorted(dates)
+
+
+def parquet_url(date_str: str) -> str:
+    """Builds the TLC CDN URL for a YYYY-MM date string."""
+    year, month = map(int, date_str.split("-"))
+    return BASE_URL_PARQUET.format(year=year, month=month)
+
+
+class TLCPublicationTrigger(BaseTrigger):
+    """
+    Polls the TLC CDN with concurrent HEAD requests until at least one of the
+    candidate months has been published, then fires with the published months.
+
+    Runs on the triggerer, so no worker slot is held while waiting.
+    """
+
+    def __init__(self, dates: Sequence[str], poll_interval: float = 3600.0):
+        super().__init__()
+        self.dates = list(dates)
+        self.poll_interval = poll_interval
+
+    def serialize(self) -> Tuple[str, Dict[str, Any]]:
+        return (
+            "include.tlc_availability.TLCPublicationTrigger",
+            {"dates": self.dates, "poll_interval": self.poll_interval},
+        )
+
+    async def _probe(self, session: aiohttp.ClientSession, date_str: str) -> bool:
+        """Returns True if the Parquet file for the given month is published."""
+        url = parquet_url(date_str)
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.warning(f"HEAD probe failed for {url}: {e}")
+            return False
+
+    async def run(self) -> AsyncIterator[TriggerEvent]:
+        timeout = aiohttp.ClientTimeout(total=PROBE_TIMEOUT_SECONDS)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                results = await asyncio.gather(*(self._probe(session, d) for d in self.dates))
+                available = [d for d, published in zip(self.dates, results) if published]
+                if available:
+                    self.log.info(f"Published months found on TLC CDN: {available}")
+                    yield TriggerEvent({"status": "success", "available_dates": available})
+                    return
+                self.log.info(
+                    f"None of {len(self.dates)} candidate month(s) published yet. "
+                    f"Checking again in {self.poll_interval} seconds."
+                )
+                await asyncio.sleep(self.poll_interval)
+
+
+class TLCPublicationSensor(BaseSensorOperator):
+    """
+    Waits until TLC has published at least one of the months reported missing by
+    check_for_new_data, and returns the published months as a comma-separated
+    string (e.g., '2024-01,2024-02') for downstream tasks.
+
+    Always defers to TLCPublicationTrigger, which HEAD-probes all candidate months
+    concurrently. If there are no candidate months, returns an empty string without deferring.
+    """
+
+    template_fields = ("missing_dates",)
+
+    def __init__(
+        self,
+        *,
+        missing_dates: str,
+        poll_interval: timedelta = timedelta(hours=1),
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.missing_dates = missing_dates
+        self.poll_interval = poll_interval
+
+    def execute(self, context) -> str:
+        dates = parse_missing_dates(self.missing_dates)
+        if not dates:
+            self.log.info("No missing dates to wait for.")
+            return ""
+
+        self.log.info(f"Waiting for TLC to publish any of {len(dates)} candidate month(s).")
+        self.defer(
+            trigger=TLCPublicationTrigger(dates=dates, poll_interval=self.poll_interval.total_seconds()),
+            method_name="execute_complete",
+            timeout=timedelta(seconds=self.timeout),
+        )
+
+    def execute_complete(self, context, event: Dict[str, Any]) -> str:
+        available = event.get("available_dates", [])
+        self.log.info(f"{len(available)} month(s) available for download: {available}")
+        return ",".join(available)
@@ -1,10 +1,14 @@
 import os
 import sys
+import time
+import argparse
 from pathlib import Path
 import logging
 import snowflake.connector
 from snowflake.connector.errors import ProgrammingError
-from typing import Set
+from typing import List, Set, Tuple
+
+from concurrency import ConcurrencyController
 
 # --- Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -26,6 +30,8 @@ if not all([SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT]):
     sys.exit(1)
 
 DATA_DIR = Path("/usr/local/airflow/data/parquet")
+# Files are staged under Hive-style prefixes so LIST and COPY only touch the months they need.
+STAGE_PREFIX = "year={year}/month={month:02d}/"
 
 def execute_sql(cursor, sql_text: str, success_msg: str = ""):
     """Executes a single SQL statement."""
@@ -37,22 +43,64 @@ def execute_sql(cursor, sql_text: str, success_msg: str = ""):
         logging.error(f"Error executing SQL:\n{sql_text}\n{e}")
         raise
 
-def list_files_in_stage(cursor, stage_name: str) -> Set[str]:
-    """Lists files in a given Snowflake stage and returns a set of filenames."""
-    logging.info(f"Listing files in stage '{stage_name}'...")
-    try:
-        cursor.execute(f"LIST @{stage_name};")
-        staged_files_raw = cursor.fetchall()
+def stage_prefix_for(local_file: Path) -> str:
+    """Returns the 'year=YYYY/month=MM/' stage prefix for a local 'YYYY-MM.parquet' file."""
+    year, month = map(int, local_file.stem.split("-"))
+    return STAGE_PREFIX.format(year=year, month=month)
+
+def list_files_in_stage(cursor, stage_name: str, prefixes: Set[str]) -> Set[str]:
+    """
+    Lists files under the given prefixes of a Snowflake stage and returns a set of
+    'year=YYYY/month=MM/filename' paths. Only the requested prefixes are listed.
+    """
+    staged_files = set()
+    for prefix in sorted(prefixes):
+        logging.info(f"Listing files in stage '{stage_name}/{prefix}'...")
+        try:
+            cursor.execute(f"LIST @{stage_name}/{prefix};")
+            staged_files_raw = cursor.fetchall()
+        except ProgrammingError as e:
+            logging.error(f"Error listing files in stage {stage_name}/{prefix}: {e}")
+            continue
         # The filename from LIST is the first column. Path().name extracts the final component.
-        staged_files = {Path(row[0]).name for row in staged_files_raw}
-        logging.info(f"Found {len(staged_files)} files in stage.")
-        return staged_files
-    except ProgrammingError as e:
-        logging.error(f"Error listing files in stage {stage_name}: {e}")
-        return set()
+        staged_files.update(f"{prefix}{Path(row[0]).name}" for row in staged_files_raw)
+    logging.info(f"Found {len(staged_files)} files in stage.")
+    return staged_files
+
+def parse_dates(dates: str) -> List[Tuple[int, int]]:
+    """Parses a comma-separated list of YYYY-MM dates into (year, month) tuples."""
+    parsed = []
+    for date_str in dates.split(","):
+        date_str = date_str.strip()
+        if not date_str:
+            continue
+        try:
+            year, month = map(int, date_str.split("-"))
+            parsed.append((year, month))
+        except ValueError:
+            logging.warning(f"Skipping invalid date format: '{date_str}'")
+    return parsed
+
+def parse_args():
+    """Parses command-line arguments for the script."""
+    parser = argparse.ArgumentParser(description="Upload new local Parquet files to the Snowflake internal stage.")
+    parser.add_argument(
+        "--dates",
+        type=str,
+        required=True,
+        help="A comma-separated list of months to upload, e.g., '2024-01,2024-03'. Only these "
+             "local files and stage prefixes are checked, so the cost does not grow with history.",
+    )
+    return parser.parse_args()
 
 def main():
-    """Connects to Snowflake and uploads only new Parquet files from a local directory."""
+    """Connects to Snowflake and uploads the given months' Parquet files if they are not staged yet."""
+    args = parse_args()
+    dates = parse_dates(args.dates)
+    if not dates:
+        logging.info("No dates to upload.")
+        return
+
     try:
         with snowflake.connector.connect(
             user=SNOWFLAKE_USER,
@@ -79,18 +127,25 @@ def main():
             # --- Compare and Upload Files ---
             logging.info("--- Starting file upload check ---")
             
-            staged_files = list_files_in_stage(cs, STAGE_NAME)
-            local_files = list(DATA_DIR.rglob("*.parquet"))
+            local_files = []
+            for year, month in dates:
+                local_file = DATA_DIR / str(year) / f"{year}-{month:02d}.parquet"
+                if local_file.exists():
+                    local_files.append(local_file)
+                else:
+                    logging.warning(f"Local file not found, skipping: {local_file}")
 
             if not local_files:
-                logging.warning(f"No .parquet files found in local directory '{DATA_DIR}'. Exiting.")
+                logging.warning(f"None of the requested files were found in local directory '{DATA_DIR}'. Exiting.")
                 return
 
+            staged_files = list_files_in_stage(cs, STAGE_NAME, {stage_prefix_for(f) for f in local_files})
+
             files_to_upload = []
             for local_file in local_files:
                 # With AUTO_COMPRESS=TRUE, Snowflake adds a .gz extension to the staged file.
                 # This is the critical part to correctly identify existing files.
-                expected_staged_filename = f"{local_file.name}"
+                expected_staged_filename = f"{stage_prefix_for(local_file)}{local_file.name}"
                 if expected_staged_filename not in staged_files:
                     files_to_upload.append(local_file)
                 else:
@@ -102,25 +157,37 @@ def main():
 
             logging.info(f"Found {len(files_to_upload)} new files to upload.")
 
+            # PUT parallelism is tuned from the throughput of previous uploads on this worker size.
+            controller = ConcurrencyController()
+            parallel = controller.recommend("put")
+            uploaded_bytes = 0
+            failed_uploads = 0
+            start = time.monotonic()
+
             for file_path in files_to_upload:
                 logging.info(f"Uploading {file_path.name}...")
                 absolute_file_path = str(file_path.resolve())
                 # Use POSIX path for cross-platform compatibility in Snowflake URIs
                 normalized_path = absolute_file_path.replace("\\", "/")
-                put_sql = f"PUT file://{normalized_path} @{STAGE_NAME} AUTO_COMPRESS=TRUE PARALLEL=16;"
+                put_sql = f"PUT file://{normalized_path} @{STAGE_NAME}/{stage_prefix_for(file_path)} AUTO_COMPRESS=TRUE PARALLEL={parallel};"
 
                 try:
                     cs.execute(put_sql)
                     # A "no results" error is expected on successful PUT, so we can't rely on simple success.
                     # The absence of a ProgrammingError other than the expected one is our success metric.
                     logging.info(f"Successfully uploaded {file_path.name}")
+                    uploaded_bytes += file_path.stat().st_size
                 except ProgrammingError as e:
                     # Per Snowflake docs, a "no results" error (253005) is expected on successful PUT.
                     # Any other error is a true failure.
                     if e.errno != 253005:
                         logging.error(f"Failed to upload {file_path.name}: {e}")
+                        failed_uploads += 1
                     else:
                          logging.info(f"Successfully uploaded {file_path.name}")
+                         uploaded_bytes += file_path.stat().st_size
+
+            controller.record("put", parallel, uploaded_bytes, time.monotonic() - start, errors=failed_uploads)
 
 
             logging.info("--- All files processed. ---")
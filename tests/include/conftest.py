@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Scripts in include/ are run as `python include/<script>.py` and import their siblings
+# directly (e.g. `from concurrency import ...`), so make those imports resolve here too.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "include"))
@@ -0,0 +1,58 @@
+"""Tests for deciding which months are loaded, using a fake Snowflake cursor."""
+
+import pytest
+from snowflake.connector.errors import ProgrammingError
+
+from include.check_for_new_data import OBJECT_DOES_NOT_EXIST, list_loaded_months
+
+
+class FakeCursor:
+    """Returns the given rows per table, or raises the given error, for each SELECT."""
+
+    def __init__(self, results):
+        self.results = results
+        self.queries = []
+        self._rows = None
+
+    def execute(self, sql):
+        self.queries.append(sql)
+        table = next(t for t in self.results if f"FROM {t}\n" in sql)
+        result = self.results[table]
+        if isinstance(result, Exception):
+            raise result
+        self._rows = result
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_loaded_months_are_normalized_filenames():
+    cursor = FakeCursor({"RAW.FHV_TRIPS": [(2025, 1), (2025, 11)]})
+    assert list_loaded_months(cursor, ["RAW.FHV_TRIPS"], range(2025, 2027)) == {"2025-01.parquet", "2025-11.parquet"}
+
+
+def test_only_requested_years_are_scanned_with_min_rows():
+    cursor = FakeCursor({"RAW.FHV_TRIPS": []})
+    list_loaded_months(cursor, ["RAW.FHV_TRIPS"], range(2024, 2026), min_rows=500)
+    (sql,) = cursor.queries
+    assert "pickup_datetime >= '2024-01-01' AND pickup_datetime < '2026-01-01'" in sql
+    assert "HAVING COUNT(*) >= 500" in sql
+
+
+def test_months_loaded_in_any_table_count():
+    cursor = FakeCursor({"RAW.FHV_TRIPS": [(2025, 1)], "MARTS.FACT_TRIPS": [(2025, 1), (2025, 2)]})
+    loaded = list_loaded_months(cursor, ["RAW.FHV_TRIPS", "MARTS.FACT_TRIPS"], [2025])
+    assert loaded == {"2025-01.parquet", "2025-02.parquet"}
+
+
+def test_missing_table_has_no_loaded_months():
+    missing = ProgrammingError("Object 'MARTS.FACT_TRIPS' does not exist", errno=OBJECT_DOES_NOT_EXIST)
+    cursor = FakeCursor({"RAW.FHV_TRIPS": [(2025, 3)], "MARTS.FACT_TRIPS": missing})
+    assert list_loaded_months(cursor, ["RAW.FHV_TRIPS", "MARTS.FACT_TRIPS"], [2025]) == {"2025-03.parquet"}
+
+
+def test_other_errors_are_raised():
+    # Treating e.g. a permission error as "nothing loaded" would reload every month.
+    cursor = FakeCursor({"RAW.FHV_TRIPS": ProgrammingError("Insufficient privileges", errno=3001)})
+    with pytest.raises(ProgrammingError):
+        list_loaded_months(cursor, ["RAW.FHV_TRIPS"], [2025])
@@ -0,0 +1,126 @@
+"""Tests for the AIMD concurrency controller, using the local file state store."""
+
+import pytest
+
+from include import concurrency
+from include.concurrency import (
+    DECREASE_FACTOR,
+    STAGES,
+    THROUGHPUT_TOLERANCE,
+    ConcurrencyController,
+    FileStateStore,
+    available_cpus,
+)
+
+
+@pytest.fixture
+def controller(tmp_path):
+    return ConcurrencyController(store=FileStateStore(tmp_path / "state.json"))
+
+
+def test_recommend_starts_at_initial(controller):
+    for stage, config in STAGES.items():
+        assert controller.recommend(stage) == min(config["initial"], config["ceiling"])
+
+
+def test_unknown_stage_raises(controller):
+    with pytest.raises(ValueError):
+        controller.recommend("unknown")
+
+
+def test_first_run_increases_additively(controller):
+    assert controller.record("copy", 4, units=1000, seconds=10) == 4 + STAGES["copy"]["step"]
+    assert controller.recommend("copy") == 4 + STAGES["copy"]["step"]
+
+
+def test_steady_throughput_increases_additively(controller):
+    controller.record("copy", 2, units=1000, seconds=10)
+    assert controller.record("copy", 3, units=1000, seconds=10) == 3 + STAGES["copy"]["step"]
+
+
+def test_drop_within_tolerance_still_increases(controller):
+    controller.record("copy", 2, units=1000, seconds=10)
+    units = 1000 * (1 - THROUGHPUT_TOLERANCE / 2)
+    assert controller.record("copy", 3, units=units, seconds=10) == 3 + STAGES["copy"]["step"]
+
+
+def test_drop_beyond_tolerance_decreases_multiplicatively(controller):
+    controller.record("copy", 2, units=1000, seconds=10)
+    units = 1000 * (1 - THROUGHPUT_TOLERANCE * 2)
+    assert controller.record("copy", 6, units=units, seconds=10) == int(6 * DECREASE_FACTOR)
+
+
+def test_errors_decrease_multiplicatively_even_if_throughput_held(controller):
+    controller.record("copy", 2, units=1000, seconds=10)
+    assert controller.record("copy", 6, units=2000, seconds=10, errors=1) == int(6 * DECREASE_FACTOR)
+
+
+def test_decrease_never_goes_below_one(controller):
+    assert controller.record("copy", 1, units=0, seconds=10, errors=3) == 1
+
+
+def test_increase_is_clamped_to_ceiling(controller):
+    ceiling = STAGES["copy"]["ceiling"]
+    assert controller.record("copy", ceiling, units=1000, seconds=10) == ceiling
+    assert controller.record("copy", ceiling + 10, units=1000, seconds=10) == ceiling
+
+
+def test_zero_duration_counts_as_zero_throughput(controller):
+    controller.record("copy", 2, units=1000, seconds=10)
+    assert controller.record("copy", 4, units=1000, seconds=0) == int(4 * DECREASE_FACTOR)
+
+
+def test_state_is_shared_through_the_store(tmp_path):
+    store = FileStateStore(tmp_path / "state.json")
+    ConcurrencyController(store=store).record("put", 16, units=1000, seconds=10)
+    ConcurrencyController(store=store).record("copy", 4, units=1000, seconds=10)
+    fresh = ConcurrencyController(store=FileStateStore(tmp_path / "state.json"))
+    assert fresh.recommend("put") == 16 + STAGES["put"]["step"]
+    assert fresh.recommend("copy") == 4 + STAGES["copy"]["step"]
+
+
+def test_state_is_kept_per_worker_size(tmp_path):
+    store = FileStateStore(tmp_path / "state.json")
+    small = ConcurrencyController(store=store)
+    small.worker_key = "2cpu"
+    large = ConcurrencyController(store=store)
+    large.worker_key = "16cpu"
+    small.record("copy", 4, units=1000, seconds=10, errors=1)
+    assert small.recommend("copy") == int(4 * DECREASE_FACTOR)
+    assert large.recommend("copy") == STAGES["copy"]["initial"]
+
+
+def test_corrupt_state_file_starts_fresh(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("{not json")
+    assert ConcurrencyController(store=FileStateStore(path)).recommend("copy") == STAGES["copy"]["initial"]
+
+
+@pytest.mark.parametrize(
+    "cpu_max, expected",
+    [("max 100000", None), ("200000 100000", 2), ("150000 100000", 2), ("50000 100000", 1)],
+)
+def test_available_cpus_honours_cgroup_v2_quota(tmp_path, monkeypatch, cpu_max, expected):
+    cpu_max_path = tmp_path / "cpu.max"
+    cpu_max_path.write_text(cpu_max)
+    monkeypatch.setattr(concurrency, "CGROUP_V2_CPU_MAX", cpu_max_path)
+    monkeypatch.setattr(concurrency.os, "sched_getaffinity", lambda pid: set(range(64)), raising=False)
+    assert available_cpus() == (expected or 64)
+
+
+def test_available_cpus_honours_cgroup_v1_quota(tmp_path, monkeypatch):
+    quota, period = tmp_path / "cpu.cfs_quota_us", tmp_path / "cpu.cfs_period_us"
+    quota.write_text("400000")
+    period.write_text("100000")
+    monkeypatch.setattr(concurrency, "CGROUP_V2_CPU_MAX", tmp_path / "missing")
+    monkeypatch.setattr(concurrency, "CGROUP_V1_CPU_QUOTA", quota)
+    monkeypatch.setattr(concurrency, "CGROUP_V1_CPU_PERIOD", period)
+    monkeypatch.setattr(concurrency.os, "sched_getaffinity", lambda pid: set(range(64)), raising=False)
+    assert available_cpus() == 4
+
+
+def test_available_cpus_uses_affinity_without_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(concurrency, "CGROUP_V2_CPU_MAX", tmp_path / "missing")
+    monkeypatch.setattr(concurrency, "CGROUP_V1_CPU_QUOTA", tmp_path / "missing")
+    monkeypatch.setattr(concurrency.os, "sched_getaffinity", lambda pid: {0, 1, 2}, raising=False)
+    assert available_cpus() == 3
@@ -0,0 +1,126 @@
+"""Tests for extracting the model graph that drives the per-model dbt task groups."""
+
+import json
+import os
+import subprocess
+
+from include.dbt_task_groups import dbt_bash_command, get_model_graph, load_manifest
+
+
+def make_manifest():
+    return {
+        "nodes": {
+            "seed.uber.seed_zone_lookup": {"resource_type": "seed", "name": "seed_zone_lookup"},
+            "model.uber.stg_uber_trips": {
+                "resource_type": "model",
+                "name": "stg_uber_trips",
+                "depends_on": {"nodes": ["source.uber.raw.fhv_trips"]},
+            },
+            "model.uber.dim_location": {
+                "resource_type": "model",
+                "name": "dim_location",
+                "depends_on": {"nodes": ["seed.uber.seed_zone_lookup"]},
+            },
+            "model.uber.fact_trips": {
+                "resource_type": "model",
+                "name": "fact_trips",
+                "depends_on": {"nodes": ["model.uber.stg_uber_trips"]},
+            },
+            "model.uber.bi_daily_trips": {
+                "resource_type": "model",
+                "name": "bi_daily_trips",
+                "depends_on": {"nodes": ["model.uber.fact_trips", "model.uber.dim_location", "macro.dbt.is_incremental"]},
+            },
+            "test.uber.unique_fact_trips_trip_id": {
+                "resource_type": "test",
+                "name": "unique_fact_trips_trip_id",
+                "depends_on": {"nodes": ["model.uber.fact_trips"]},
+            },
+            "test.uber.relationships_bi_daily_trips": {
+                "resource_type": "test",
+                "name": "relationships_bi_daily_trips",
+                "depends_on": {"nodes": ["model.uber.bi_daily_trips", "model.uber.dim_location"]},
+            },
+            "test.uber.source_not_null_fhv_trips": {
+                "resource_type": "test",
+                "name": "source_not_null_fhv_trips",
+                "depends_on": {"nodes": ["source.uber.raw.fhv_trips"]},
+            },
+        }
+    }
+
+
+def test_get_model_graph_returns_only_models():
+    models, _, _ = get_model_graph(make_manifest())
+    assert models == {
+        "model.uber.stg_uber_trips": "stg_uber_trips",
+        "model.uber.dim_location": "dim_location",
+        "model.uber.fact_trips": "fact_trips",
+        "model.uber.bi_daily_trips": "bi_daily_trips",
+    }
+
+
+def test_get_model_graph_keeps_only_model_dependencies():
+    _, upstream, _ = get_model_graph(make_manifest())
+    assert upstream == {
+        "model.uber.stg_uber_trips": [],
+        "model.uber.dim_location": [],
+        "model.uber.fact_trips": ["model.uber.stg_uber_trips"],
+        "model.uber.bi_daily_trips": ["model.uber.dim_location", "model.uber.fact_trips"],
+    }
+
+
+def test_get_model_graph_flags_models_with_tests():
+    _, _, has_tests = get_model_graph(make_manifest())
+    assert has_tests == {
+        "model.uber.stg_uber_trips": False,
+        "model.uber.dim_location": True,
+        "model.uber.fact_trips": True,
+        "model.uber.bi_daily_trips": True,
+    }
+
+
+def test_get_model_graph_empty_manifest():
+    assert get_model_graph({}) == ({}, {}, {})
+
+
+def test_load_manifest_missing_or_invalid(tmp_path):
+    assert load_manifest(tmp_path / "manifest.json") is None
+    invalid = tmp_path / "invalid.json"
+    invalid.write_text("{not json")
+    assert load_manifest(invalid) is None
+
+
+def test_load_manifest(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(make_manifest()))
+    assert load_manifest(path) == make_manifest()
+
+
+def run_dbt_bash_command(tmp_path, command):
+    """Runs the command with a fake dbt that prints its arguments and its target path's files."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake_dbt = bin_dir / "dbt"
+    fake_dbt.write_text('#!/bin/bash\necho "$@"\nls "${@: -1}"\n')
+    fake_dbt.chmod(0o755)
+    (tmp_path / "dbt" / "target").mkdir(parents=True, exist_ok=True)
+    env = {**os.environ, "PATH": f"{bin_dir}:{os.environ['PATH']}"}
+    return subprocess.run(["bash", "-c", command], cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+
+
+def test_dbt_bash_command_seeds_target_path_with_partial_parse(tmp_path):
+    (tmp_path / "dbt" / "target").mkdir(parents=True)
+    (tmp_path / "dbt" / "target" / "partial_parse.msgpack").write_bytes(b"parsed")
+    result = run_dbt_bash_command(tmp_path, dbt_bash_command("run --select fact_trips", "target/airflow/fact_trips/run"))
+
+    assert result.stdout.splitlines() == [
+        "run --select fact_trips --target-path target/airflow/fact_trips/run",
+        "partial_parse.msgpack",
+    ]
+    assert (tmp_path / "dbt/target/airflow/fact_trips/run/partial_parse.msgpack").read_bytes() == b"parsed"
+
+
+def test_dbt_bash_command_without_partial_parse_still_runs(tmp_path):
+    result = run_dbt_bash_command(tmp_path, dbt_bash_command("test --select fact_trips", "target/airflow/fact_trips/test"))
+    assert result.stdout.splitlines() == ["test --select fact_trips --target-path target/airflow/fact_trips/test"]
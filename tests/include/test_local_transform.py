@@ -0,0 +1,120 @@
+"""
+Tests that the local transform reproduces the dbt surrogate keys byte for byte.
+
+Expected digests are md5 hashes of the strings dbt_utils.generate_surrogate_key builds in
+Snowflake: values cast to VARCHAR, NULLs replaced by '_dbt_utils_surrogate_key_null_', joined by '-'.
+"""
+
+from datetime import datetime
+
+import pyarrow as pa
+import pytest
+
+from include.local_transform import (
+    FACT_SCHEMA,
+    FLAG_COLUMNS,
+    build_fact_table,
+    snowflake_timestamp_strings,
+    trip_flag_ids,
+    trip_ids,
+)
+
+
+def timestamps(*values):
+    return pa.array(list(values), pa.timestamp("us"))
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (datetime(2025, 1, 1), "2025-01-01 00:00:00.000"),
+        (datetime(2025, 3, 9, 14, 5, 7, 123000), "2025-03-09 14:05:07.123"),
+        # FF3 truncates sub-millisecond digits rather than rounding them.
+        (datetime(2025, 1, 1, 8, 15, 30, 123999), "2025-01-01 08:15:30.123"),
+        (datetime(2024, 12, 31, 23, 59, 59, 999999), "2024-12-31 23:59:59.999"),
+    ],
+)
+def test_snowflake_timestamp_strings(value, expected):
+    assert snowflake_timestamp_strings(timestamps(value)).to_pylist() == [expected]
+
+
+def test_snowflake_timestamp_strings_from_nanoseconds():
+    ts = pa.array([datetime(2025, 1, 1, 0, 0, 0, 500000)], pa.timestamp("ns"))
+    assert snowflake_timestamp_strings(ts).to_pylist() == ["2025-01-01 00:00:00.500"]
+
+
+@pytest.mark.parametrize(
+    "pickup, dropoff, expected",
+    [
+        # md5('2025-01-01 00:00:00.000-2025-01-01 00:10:00.000')
+        (datetime(2025, 1, 1), datetime(2025, 1, 1, 0, 10), "c6153f0735dbbe8a3ff698f651e9bb51"),
+        # md5('2025-01-01 08:15:30.123-2025-01-01 08:40:05.500')
+        (
+            datetime(2025, 1, 1, 8, 15, 30, 123456),
+            datetime(2025, 1, 1, 8, 40, 5, 500000),
+            "dc1d761da8dc8ee59a572d896a043736",
+        ),
+    ],
+)
+def test_trip_ids(pickup, dropoff, expected):
+    assert trip_ids(timestamps(pickup), timestamps(dropoff)).to_pylist() == [expected]
+
+
+def flag_table(rows, columns=FLAG_COLUMNS):
+    return pa.table({column: pa.array([row[i] for row in rows], pa.string()) for i, column in enumerate(columns)})
+
+
+def test_trip_flag_ids():
+    table = flag_table(
+        [
+            # md5('true-false-_dbt_utils_surrogate_key_null_-true-false')
+            ("Y", "N", None, "Y", "N"),
+            # md5('false-false-false-false-false')
+            ("N", "N", "N", "N", "N"),
+            # Values other than 'Y'/'N' are NULL booleans in stg_uber_trips:
+            # md5('_dbt_utils_surrogate_key_null_-...-_dbt_utils_surrogate_key_null_')
+            (None, " ", None, "", None),
+        ]
+    )
+    assert trip_flag_ids(table).to_pylist() == [
+        "99f3b4dd0cd93617880c0b0e52d2162c",
+        "baef476209fe5296d2eab8982d2522d9",
+        "9a351ab96d001792bc353da0f488b49e",
+    ]
+
+
+def test_trip_flag_ids_missing_column_hashes_as_null():
+    # md5('false-false-false-false-_dbt_utils_surrogate_key_null_')
+    table = flag_table([("N", "N", "N", "N")], columns=FLAG_COLUMNS[:-1])
+    assert trip_flag_ids(table).to_pylist() == ["6cbca969970a70ff2914c1db665540e4"]
+
+
+def test_build_fact_table_filters_and_fills_missing_measures():
+    pickup = [datetime(2025, 1, 1), datetime(2025, 1, 2), None, datetime(2025, 1, 3)]
+    raw = pa.table(
+        {
+            "hvfhs_license_num": ["HV0003", "HV0005", "HV0003", "HV0003"],
+            "request_datetime": timestamps(*pickup),
+            "on_scene_datetime": timestamps(*pickup),
+            "pickup_datetime": timestamps(*pickup),
+            "dropoff_datetime": timestamps(datetime(2025, 1, 1, 0, 10), datetime(2025, 1, 2, 0, 10), datetime(2025, 1, 2), None),
+            "PULocationID": pa.array([132, 1, 2, 3], pa.int32()),
+            "DOLocationID": pa.array([138, 1, 2, 3], pa.int32()),
+            "base_passenger_fare": [25.5, 1.0, 1.0, 1.0],
+            "driver_pay": [20.0, 1.0, 1.0, 1.0],
+            **{column: ["N"] * 4 for column in FLAG_COLUMNS},
+        }
+    )
+    fact = build_fact_table(raw)
+
+    # Only the Uber trip with both pickup and dropoff times is kept.
+    assert fact.schema == FACT_SCHEMA
+    assert fact.num_rows == 1
+    row = fact.to_pylist()[0]
+    assert row["trip_id"] == "c6153f0735dbbe8a3ff698f651e9bb51"
+    assert row["trip_flags_id"] == "baef476209fe5296d2eab8982d2522d9"
+    assert (row["pulocation_id"], row["dolocation_id"]) == (132, 138)
+    assert (row["base_passenger_fare"], row["driver_pay"]) == (25.5, 20.0)
+    # Older months predate some fees; like the raw load, they are NULL rather than 0.
+    assert row["cbd_congestion_fee"] is None
+    assert row["trip_time"] is None
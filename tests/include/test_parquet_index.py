@@ -0,0 +1,67 @@
+"""Tests for the zone-map sidecar indexes over the local Parquet archive."""
+
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from include.parquet_index import build_indexes, extract, index_path_for, load_index, matching_row_groups
+
+
+def write_month(path, pickups, pu_zones):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.table(
+        {
+            "pickup_datetime": pa.array(pickups, pa.timestamp("us")),
+            "PULocationID": pa.array(pu_zones, pa.int32()),
+            "DOLocationID": pa.array([1] * len(pu_zones), pa.int32()),
+        }
+    )
+    pq.write_table(table, path, row_group_size=2)
+
+
+def test_build_indexes_skips_unreadable_files(tmp_path):
+    good = tmp_path / "2025" / "2025-01.parquet"
+    write_month(good, [datetime(2025, 1, 1), datetime(2025, 1, 2), datetime(2025, 1, 20)], [1, 2, 3])
+    corrupt = tmp_path / "2025" / "2025-02.parquet"
+    corrupt.write_bytes(b"truncated download")
+
+    assert build_indexes(tmp_path) == 1
+    assert not index_path_for(corrupt).exists()
+    assert len(load_index(good)["row_groups"]) == 2
+
+
+def test_matching_row_groups_skips_unreadable_files(tmp_path):
+    good = tmp_path / "2025" / "2025-01.parquet"
+    write_month(good, [datetime(2025, 1, 1), datetime(2025, 1, 2), datetime(2025, 1, 20)], [1, 2, 3])
+    (tmp_path / "2025" / "2025-02.parquet").write_bytes(b"truncated download")
+
+    assert matching_row_groups(tmp_path, start=datetime(2025, 1, 15)) == {good: [1]}
+
+
+def test_extract_combines_months_with_different_schemas(tmp_path):
+    old = tmp_path / "2024" / "2024-12.parquet"
+    write_month(old, [datetime(2024, 12, 31, 23, 30)], [7])
+    new = tmp_path / "2025" / "2025-01.parquet"
+    new.parent.mkdir()
+    # 2025 months add cbd_congestion_fee and, here, store zones as int64.
+    pq.write_table(
+        pa.table(
+            {
+                "pickup_datetime": pa.array([datetime(2025, 1, 1, 0, 15)], pa.timestamp("us")),
+                "PULocationID": pa.array([7], pa.int64()),
+                "DOLocationID": pa.array([1], pa.int64()),
+                "cbd_congestion_fee": pa.array([1.5]),
+            }
+        ),
+        new,
+    )
+    output = tmp_path / "out" / "extract.parquet"
+
+    matches = matching_row_groups(tmp_path, pu_zone=7)
+    assert extract(matches, output, pu_zone=7) == 2
+
+    result = pq.read_table(output)
+    assert result.schema.field("PULocationID").type == pa.int64()
+    assert result["cbd_congestion_fee"].to_pylist() == [None, 1.5]
+    assert result["pickup_datetime"].to_pylist() == [datetime(2024, 12, 31, 23, 30), datetime(2025, 1, 1, 0, 15)]
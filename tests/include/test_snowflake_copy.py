@@ -0,0 +1,223 @@
+"""Tests for the deferrable parallel COPY load, using a fake Snowflake connection."""
+
+import asyncio
+import json
+
+import pytest
+from airflow.exceptions import AirflowException, TaskDeferred
+from snowflake.connector.errors import ProgrammingError
+
+from include import snowflake_copy
+from include.raw_table import STAGE_NAME, list_staged_batches
+from include.snowflake_copy import SnowflakeParallelCopyOperator, SnowflakeQueryTrigger
+
+STAGE_DIR = STAGE_NAME.rsplit(".", 1)[-1].lower()
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.sfqid = None
+
+    def execute(self, sql):
+        self.conn.executed.append(sql)
+        if sql.startswith("LIST "):
+            prefix = sql.split(f"@{STAGE_NAME}/", 1)[1].split(" ", 1)[0]
+            self.rows = [[path] for path in self.conn.listing.get(prefix, [])]
+
+    def fetchall(self):
+        return self.rows
+
+    def execute_async(self, sql):
+        self.sfqid = f"q{len(self.conn.submitted)}"
+        self.conn.submitted[self.sfqid] = sql
+        self.conn.running.add(self.sfqid)
+
+    def get_results_from_sfqid(self, query_id):
+        self.rows = self.conn.results.get(query_id, [(f"{query_id}.parquet", "LOADED", 10, 10)])
+
+
+class FakeConnection:
+    """Queries run until finish() is called; failed queries raise when their status is checked."""
+
+    def __init__(self, listing=None):
+        self.listing = listing or {}  # stage prefix -> LIST paths
+        self.executed = []
+        self.submitted = {}  # query ID -> COPY statement
+        self.running = set()
+        self.failed = set()
+        self.results = {}  # query ID -> COPY result rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_query_status(self, query_id):
+        return "RUNNING" if query_id in self.running else "SUCCESS"
+
+    def is_still_running(self, status):
+        return status == "RUNNING"
+
+    def get_query_status_throw_if_error(self, query_id):
+        if query_id in self.failed:
+            raise ProgrammingError(f"COPY {query_id} failed")
+
+    def finish(self, *query_ids):
+        self.running.difference_update(query_ids)
+        return list(query_ids)
+
+
+class FakeController:
+    records = []
+
+    def recommend(self, stage):
+        return 2
+
+    def record(self, stage, level, units, seconds, errors=0):
+        self.records.append((stage, level, units, errors))
+
+
+def staged(*months):
+    """LIST output for one staged file per YYYY-MM month."""
+    listing = {}
+    for month in months:
+        year, mm = month.split("-")
+        prefix = f"year={year}/month={mm}/"
+        listing[prefix] = [f"{STAGE_DIR}/{prefix}{month}.parquet"]
+    return listing
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection(staged("2024-01", "2024-02", "2024-03"))
+    monkeypatch.setattr(snowflake_copy, "connect", lambda: conn)
+    FakeController.records = []
+    monkeypatch.setattr(snowflake_copy, "ConcurrencyController", FakeController)
+    return conn
+
+
+def resume(operator, event, state):
+    """Resumes the operator like the triggerer would, after a JSON round-trip of its state."""
+    state = json.loads(json.dumps(state))
+    operator.execute_complete({}, event, state)
+
+
+def test_list_staged_batches_parses_list_paths():
+    cursor = FakeConnection(
+        {
+            "year=2024/month=01/": [
+                f"{STAGE_DIR}/year=2024/month=01/2024-01.parquet.gz",
+                f"{STAGE_DIR}/year=2024/month=01/2024-01_1.parquet",
+                f"{STAGE_DIR}/year=2024/month=01/2024-01_2.parquet",
+            ],
+            "year=2024/month=02/": [f"{STAGE_DIR}/year=2024/month=02/2024-02.parquet"],
+        }
+    ).cursor()
+    batches = list_staged_batches(cursor, ["2024-01", "2024-02"], batch_size=2)
+    assert batches == {
+        "2024-01": ("year=2024/month=01/", ["2024-01.parquet.gz", "2024-01_1.parquet"]),
+        "2024-01#2": ("year=2024/month=01/", ["2024-01_2.parquet"]),
+        "2024-02": ("year=2024/month=02/", ["2024-02.parquet"]),
+    }
+
+
+def test_list_staged_batches_only_lists_requested_months():
+    conn = FakeConnection(staged("2024-01", "2024-02"))
+    assert list(list_staged_batches(conn.cursor(), ["2024-02", "2024-05"], batch_size=1)) == ["2024-02"]
+    assert [sql.split(" ")[1] for sql in conn.executed] == [
+        f"@{STAGE_NAME}/year=2024/month=02/",
+        f"@{STAGE_NAME}/year=2024/month=05/",
+    ]
+
+
+def test_execute_submits_up_to_max_concurrent_and_defers(conn):
+    operator = SnowflakeParallelCopyOperator(task_id="load", dates="2024-01,2024-02,2024-03")
+    with pytest.raises(TaskDeferred) as deferred:
+        operator.execute({})
+
+    assert sorted(conn.running) == ["q0", "q1"]
+    assert "FILES = ('2024-01.parquet')" in conn.submitted["q0"]
+    assert deferred.value.method_name == "execute_complete"
+    assert deferred.value.trigger.query_ids == ["q0", "q1"]
+    state = deferred.value.kwargs["state"]
+    assert json.loads(json.dumps(state)) == state
+    assert [batch[0] for batch in state["pending"]] == ["2024-03"]
+
+
+def test_execute_without_dates_or_files_does_not_defer(conn):
+    assert SnowflakeParallelCopyOperator(task_id="load", dates="").execute({}) is None
+    assert SnowflakeParallelCopyOperator(task_id="load", dates="2025-01").execute({}) is None
+    assert not conn.submitted
+
+
+def test_load_resubmits_and_redefers_until_all_batches_finish(conn):
+    operator = SnowflakeParallelCopyOperator(task_id="load", dates="2024-01,2024-02,2024-03")
+    with pytest.raises(TaskDeferred) as deferred:
+        operator.execute({})
+    state = deferred.value.kwargs["state"]
+
+    # One COPY finished: the last batch is submitted and the task defers on the two running.
+    with pytest.raises(TaskDeferred) as deferred:
+        resume(operator, {"finished": conn.finish("q0")}, state)
+    state = deferred.value.kwargs["state"]
+    assert sorted(deferred.value.trigger.query_ids) == ["q1", "q2"]
+    assert len(state["running"]) <= state["max_concurrent"]
+    assert state["pending"] == []
+    assert state["totals"]["rows_loaded"] == 10
+
+    # One still running: defer again without submitting anything.
+    with pytest.raises(TaskDeferred) as deferred:
+        resume(operator, {"finished": conn.finish("q1")}, state)
+    state = deferred.value.kwargs["state"]
+    assert deferred.value.trigger.query_ids == ["q2"]
+
+    # Last one finished: the task completes and records the throughput.
+    resume(operator, {"finished": conn.finish("q2")}, state)
+    assert len(conn.submitted) == 3
+    assert FakeController.records == [("copy", 2, 30, 0)]
+
+
+@pytest.mark.parametrize("failure", ["query", "file"])
+def test_finish_raises_on_failed_batches(conn, failure):
+    if failure == "query":
+        conn.failed.add("q0")
+    else:
+        conn.results["q0"] = [("2024-01.parquet", "LOAD_FAILED", 10, 0)]
+    operator = SnowflakeParallelCopyOperator(task_id="load", dates="2024-01,2024-02")
+    with pytest.raises(TaskDeferred) as deferred:
+        operator.execute({})
+    state = deferred.value.kwargs["state"]
+
+    with pytest.raises(AirflowException, match="1 COPY batch"):
+        resume(operator, {"finished": conn.finish("q0", "q1")}, state)
+    assert FakeController.records == [("copy", 2, 10, 1)]
+
+
+def test_trigger_serializes_and_fires_with_finished_queries(conn, monkeypatch):
+    conn.running.update({"q0", "q1"})
+    trigger = SnowflakeQueryTrigger(["q0", "q1"], poll_interval=0)
+    classpath, kwargs = trigger.serialize()
+    assert classpath == "include.snowflake_copy.SnowflakeQueryTrigger"
+    assert kwargs == {"query_ids": ["q0", "q1"], "poll_interval": 0}
+
+    async def first_event():
+        polls = 0
+        original_sleep = asyncio.sleep
+
+        async def sleep(seconds):
+            nonlocal polls
+            polls += 1
+            if polls == 2:
+                conn.finish("q1")
+            await original_sleep(0)
+
+        monkeypatch.setattr(snowflake_copy.asyncio, "sleep", sleep)
+        return await SnowflakeQueryTrigger(**kwargs).run().__anext__()
+
+    assert asyncio.run(first_event()).payload == {"status": "success", "finished": ["q1"]}
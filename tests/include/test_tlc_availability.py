@@ -0,0 +1,30 @@
+"""Tests for parsing the check_for_new_data output consumed by the TLC publication sensor."""
+
+import pytest
+
+from include.tlc_availability import parse_missing_dates, parquet_url
+
+
+@pytest.mark.parametrize("output", ["", None, "missing_dates=", "   "])
+def test_parse_missing_dates_empty(output):
+    assert parse_missing_dates(output) == []
+
+
+def test_parse_missing_dates_strips_output_prefix():
+    assert parse_missing_dates("missing_dates=2024-01,2024-02") == ["2024-01", "2024-02"]
+
+
+def test_parse_missing_dates_accepts_plain_list():
+    assert parse_missing_dates("2024-01,2024-02") == ["2024-01", "2024-02"]
+
+
+def test_parse_missing_dates_normalizes_sorts_and_deduplicates():
+    assert parse_missing_dates(" 2025-3, 2024-12 ,2025-03,") == ["2024-12", "2025-03"]
+
+
+def test_parse_missing_dates_skips_invalid_entries():
+    assert parse_missing_dates("2024-01,not-a-date,2024,2024-02") == ["2024-01", "2024-02"]
+
+
+def test_parquet_url_pads_month():
+    assert parquet_url("2024-3").endswith("/fhvhv_tripdata_2024-03.parquet")